@@ -0,0 +1,42 @@
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с пулом соединений из OPTIONS['pool'] (min_size,
+    max_size, timeout): закрытие соединения возвращает его в пул.
+    """
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict['OPTIONS']
+        if 'pool' not in options:
+            return super().get_new_connection(conn_params)
+        self.pool = get_pool(conn_params, options['pool'])
+        connection = self.pool.get()
+        # Как в базовом классе: уровень изоляции из OPTIONS или
+        # умолчание сервера.
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            return self.pool.put(self.connection)
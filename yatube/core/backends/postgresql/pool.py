@@ -0,0 +1,66 @@
+import os
+import threading
+
+from psycopg2 import OperationalError
+from psycopg2.pool import ThreadedConnectionPool
+
+_pools = {}
+_lock = threading.Lock()
+
+
+class Pool:
+    """
+    Соединения процесса с одной базой, общие для его потоков.
+    Когда все max_size заняты, поток ждёт освобождения до timeout.
+    """
+
+    def __init__(self, params, min_size=1, max_size=10, timeout=10):
+        self.database = params.get('database')
+        self.connections = ThreadedConnectionPool(min_size, max_size, **params)
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+
+    def get(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'Пул соединений с {self.database} исчерпан'
+            )
+        try:
+            connection = self.connections.getconn()
+            # Соединение, закрытое при возврате, пулу больше не нужно.
+            while connection.closed:
+                self.connections.putconn(connection, close=True)
+                connection = self.connections.getconn()
+            return connection
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def put(self, connection):
+        """ Незавершённая транзакция откатывается, оборванное закрывается. """
+        try:
+            self.connections.putconn(connection, close=bool(connection.closed))
+        finally:
+            self.slots.release()
+
+    def close(self):
+        self.connections.closeall()
+
+
+def get_pool(params, options):
+    # После fork у процесса свой пул: сокеты родителя не делятся.
+    key = (os.getpid(), tuple(sorted(params.items())))
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = Pool(params, **options)
+        return pool
+
+
+def close_pools(database):
+    """ Закрывает простаивающие соединения пулов этой базы. """
+    with _lock:
+        for key, pool in list(_pools.items()):
+            if pool.database == database:
+                pool.close()
+                del _pools[key]
@@ -0,0 +1,62 @@
+import random
+import time
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+# Первая пауза перед повтором BEGIN, секунды; дальше растёт вдвое.
+RETRY_BACKOFF = 0.05
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite с настройкой соединения при открытии. Кроме аргументов
+    sqlite3.connect, OPTIONS принимает:
+    pragmas — PRAGMA, выполняемые на каждом новом соединении;
+    transaction_mode — DEFERRED, IMMEDIATE или EXCLUSIVE для BEGIN
+    в transaction.atomic();
+    retries — сколько раз повторить BEGIN, если база заблокирована
+    дольше timeout.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for name in ('pragmas', 'transaction_mode', 'retries'):
+            params.pop(name, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = dict(self.settings_dict['OPTIONS'].get('pragmas', {}))
+        # Режим журнала хранится в файле, а его смена требует
+        # монопольного доступа: процессы, открывающие соединения
+        # одновременно, не должны выставлять его заново.
+        mode = pragmas.pop('journal_mode', None)
+        if mode is not None:
+            current, = conn.execute('PRAGMA journal_mode').fetchone()
+            if current.upper() != mode.upper():
+                conn.execute(f'PRAGMA journal_mode = {mode}')
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        """
+        Транзакция сразу берёт блокировку записи: отложенная, успев
+        прочитать, не может дождаться чужой записи — SQLite сразу
+        отвечает database is locked, не дожидаясь timeout.
+        """
+        options = self.settings_dict['OPTIONS']
+        mode = options.get('transaction_mode')
+        if not mode:
+            return super()._start_transaction_under_autocommit()
+        retries = options.get('retries', 0)
+        for attempt in range(retries + 1):
+            try:
+                self.cursor().execute(f'BEGIN {mode}')
+                return
+            except OperationalError as error:
+                if attempt == retries or 'locked' not in str(error):
+                    raise
+            pause = RETRY_BACKOFF * 2 ** attempt
+            time.sleep(pause * random.uniform(0.5, 1.5))
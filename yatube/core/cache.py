@@ -0,0 +1,332 @@
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+MISSING = object()
+CLEAR_ALL = '*'
+
+# Django создаёт бэкенд кэша на каждый поток; клиент и ближний кэш
+# должны быть общими для процесса.
+_shared = {}
+_shared_lock = threading.RLock()
+
+
+def shared(key, factory):
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = factory()
+        return _shared[key]
+
+
+def dumps(value):
+    # Целые храним как есть, чтобы INCRBY работал на стороне сервера.
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data):
+    try:
+        return int(data)
+    except ValueError:
+        return pickle.loads(data)
+
+
+class LRUCache:
+    """ Потокобезопасный LRU с TTL: ближний кэш процесса. """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Растёт с каждым сбросом ключа: значение, прочитанное с сервера
+        # до сброса, в ближний кэш уже не кладётся.
+        self.generation = 0
+        self.subscriber_pid = None
+        self.token = None
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISSING
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None, generation=None):
+        timeout = self.timeout if timeout is None else min(
+            timeout, self.timeout
+        )
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def invalidate(self, message):
+        sender, key = message['data'].decode().split(' ', 1)
+        # Свою копию процесс уже сбросил при записи; поздно пришедшее
+        # собственное сообщение стёрло бы значение, прочитанное после.
+        if sender == self.token:
+            return
+        if key == CLEAR_ALL:
+            self.clear()
+        else:
+            self.delete(key)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache(BaseCache):
+    """
+    Общий для всех процессов кэш на сервере с протоколом Redis.
+    OPTIONS['CLIENT_FACTORY'] — путь к фабрике клиента по LOCATION.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        self._server = server
+        self._options = params.get('OPTIONS', {})
+        self._client = None
+
+    def _connect(self):
+        factory = self._options.get('CLIENT_FACTORY')
+        if factory:
+            return import_string(factory)(self._server)
+        import redis
+        return redis.Redis.from_url(self._server)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = shared(
+                ('client', self._server, self._options.get('CLIENT_FACTORY')),
+                self._connect
+            )
+        return self._client
+
+    def _key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _ttl(self, timeout):
+        """ Время жизни в миллисекундах, None — без срока. """
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return max(int(timeout * 1000), 0)
+
+    def _store(self, key, value, timeout, only_new=False):
+        ttl = self._ttl(timeout)
+        if ttl == 0:
+            if only_new:
+                return False
+            self.client.delete(key)
+            return True
+        return bool(self.client.set(key, dumps(value), px=ttl, nx=only_new))
+
+    def _fetch(self, key):
+        return self.client.get(key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        added = self._store(key, value, timeout, only_new=True)
+        if added:
+            self._changed(key)
+        return added
+
+    def get(self, key, default=None, version=None):
+        data = self._fetch(self._key(key, version))
+        return default if data is None else loads(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._store(key, value, timeout)
+        self._changed(key)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return bool(self.client.persist(key))
+        return bool(self.client.pexpire(key, ttl))
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self.client.delete(key)
+        self._changed(key)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        values = self.client.mget(list(keys))
+        return {
+            keys[key]: loads(data)
+            for key, data in zip(keys, values) if data is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        ttl = self._ttl(timeout)
+        pipeline = self.client.pipeline()
+        keys = []
+        for key, value in data.items():
+            key = self._key(key, version)
+            keys.append(key)
+            if ttl == 0:
+                pipeline.delete(key)
+            else:
+                pipeline.set(key, dumps(value), px=ttl)
+        pipeline.execute()
+        for key in keys:
+            self._changed(key)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self.client.delete(*keys)
+        for key in keys:
+            self._changed(key)
+
+    def has_key(self, key, version=None):
+        return bool(self.client.exists(self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+
+        def increment(pipeline):
+            # Ключ под WATCH: удали его кто-то между проверкой и
+            # INCRBY, транзакция повторится и заметит пропажу.
+            if not pipeline.exists(key):
+                raise ValueError(f"Key '{key}' not found")
+            pipeline.multi()
+            pipeline.incrby(key, delta)
+
+        value, = self.client.transaction(increment, key)
+        self._changed(key)
+        return value
+
+    def clear(self):
+        self.client.flushdb()
+        self._changed(CLEAR_ALL)
+
+    def _changed(self, key):
+        """ Хук для наследников: ключ изменился на сервере. """
+
+    def close(self, **kwargs):
+        pass
+
+
+class NearCache(RedisCache):
+    """
+    RedisCache с ближним LRU-кэшем в каждом процессе.
+    Изменения рассылаются через pub/sub, и остальные процессы
+    сбрасывают свои копии ключа; TTL ближнего кэша ограничивает
+    устаревание, если сообщение потеряно. Ключи с префиксами из
+    OPTIONS['L1_EXCLUDE'] — по умолчанию версии и времена изменения
+    страничного кэша — всегда читаются с сервера.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self.channel = self._options.get(
+            'INVALIDATION_CHANNEL', f'{self.key_prefix}cache-invalidation'
+        )
+        self.local = shared(
+            ('local', server, self.channel),
+            lambda: LRUCache(
+                self._options.get('L1_MAX_ENTRIES', 1000),
+                self._options.get('L1_TIMEOUT', 5),
+            )
+        )
+        self.exclude = tuple(
+            self._options.get('L1_EXCLUDE', ('version:', 'modified:'))
+        )
+
+    def _subscribe(self):
+        # Поток подписки не переживает fork: в новом процессе
+        # ближний кэш сбрасывается и подписка создаётся заново.
+        pid = os.getpid()
+        if self.local.subscriber_pid == pid:
+            return
+        with _shared_lock:
+            if self.local.subscriber_pid == pid:
+                return
+            self.local.clear()
+            self.local.token = uuid.uuid4().hex
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.channel: self.local.invalidate})
+            pubsub.run_in_thread(sleep_time=0.1, daemon=True)
+            self.local.subscriber_pid = pid
+
+    def get(self, key, default=None, version=None):
+        if key.startswith(self.exclude):
+            data = self.client.get(self._key(key, version))
+            return default if data is None else loads(data)
+        return super().get(key, default, version)
+
+    def _fetch(self, key):
+        self._subscribe()
+        data = self.local.get(key)
+        if data is MISSING:
+            # Пока читаем, другой поток процесса мог записать ключ: его
+            # собственное сообщение об этом процесс пропускает.
+            generation = self.local.generation
+            data, ttl = self.client.pipeline().get(key).pttl(key).execute()
+            if data is not None:
+                self.local.set(
+                    key, data, ttl / 1000 if ttl > 0 else None, generation
+                )
+        return data
+
+    def get_many(self, keys, version=None):
+        # Промахи ближнего кэша читаются одним MGET и в него не попадают.
+        self._subscribe()
+        found = {}
+        missing = []
+        for key in keys:
+            if key.startswith(self.exclude):
+                missing.append(key)
+                continue
+            data = self.local.get(self._key(key, version))
+            if data is MISSING:
+                missing.append(key)
+            else:
+                found[key] = loads(data)
+        found.update(super().get_many(missing, version=version))
+        return found
+
+    def _changed(self, key):
+        self._subscribe()
+        if key == CLEAR_ALL:
+            self.local.clear()
+        else:
+            self.local.delete(key)
+        self.client.publish(self.channel, f'{self.local.token} {key}')
@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _cached_templates():
+    return all(
+        any(
+            isinstance(loader, (tuple, list)) and loader[0] == CACHED_LOADER
+            for loader in engine.engine.loaders
+        )
+        for engine in engines.all() if isinstance(engine, DjangoTemplates)
+    )
+
+
+def performance_options():
+    """
+    Список (id проверки, опция, включена ли, подробности) для отчёта
+    при старте. Id закреплены за опциями: на них ссылается
+    SILENCED_SYSTEM_CHECKS, новым опциям — новые номера.
+    """
+    # Базы с пулом соединений держат их между запросами в пуле.
+    databases = {
+        alias: options.get('CONN_MAX_AGE', 0)
+        for alias, options in settings.DATABASES.items()
+        if 'pool' not in options.get('OPTIONS', {})
+    }
+    caches = {
+        alias: options['BACKEND'] for alias, options in settings.CACHES.items()
+    }
+    sqlite = {
+        alias: options.get('OPTIONS', {})
+        for alias, options in settings.DATABASES.items()
+        if options['ENGINE'].endswith('sqlite3')
+    }
+    return [
+        (
+            'core.W001', 'DEBUG выключен', not settings.DEBUG,
+            f'DEBUG={settings.DEBUG}',
+        ),
+        (
+            'core.W002', 'отладочные приложения не подключены',
+            'debug_toolbar' not in settings.INSTALLED_APPS,
+            'debug_toolbar',
+        ),
+        (
+            'core.W003', 'кэширующий загрузчик шаблонов',
+            _cached_templates(), CACHED_LOADER,
+        ),
+        (
+            'core.W004', 'постоянные соединения с БД',
+            all(age is None or age > 0 for age in databases.values()),
+            ', '.join(
+                f'{alias}: CONN_MAX_AGE={age}'
+                for alias, age in databases.items()
+            ) or 'пул соединений',
+        ),
+        (
+            'core.W005', 'SQLite: журнал WAL и транзакции IMMEDIATE',
+            all(
+                str(options.get('pragmas', {}).get('journal_mode')).upper()
+                == 'WAL' and options.get('transaction_mode')
+                for options in sqlite.values()
+            ),
+            ', '.join(
+                f'{alias}: journal_mode='
+                f'{options.get("pragmas", {}).get("journal_mode")}, '
+                f'transaction_mode={options.get("transaction_mode")}'
+                for alias, options in sqlite.items()
+            ) or 'SQLite не используется',
+        ),
+        (
+            'core.W006', 'проверка соединений перед запросом',
+            settings.CONN_HEALTH_CHECKS,
+            f'CONN_HEALTH_CHECKS={settings.CONN_HEALTH_CHECKS}',
+        ),
+        (
+            'core.W007', 'общий для процессов кэш',
+            all(backend not in LOCAL_CACHES for backend in caches.values()),
+            ', '.join(f'{alias}: {backend}'
+                      for alias, backend in caches.items()),
+        ),
+        (
+            'core.W008', 'нарезка картинок в фоне',
+            settings.THUMBNAIL_WORKERS > 0,
+            f'THUMBNAIL_WORKERS={settings.THUMBNAIL_WORKERS}',
+        ),
+    ]
+
+
+def report():
+    """ Строки отчёта о производительных настройках профиля. """
+    return [f'Профиль настроек: {getattr(settings, "ENV", "?")}'] + [
+        f'[{"+" if active else "-"}] {name} ({detail})'
+        for _, name, active, detail in performance_options()
+    ]
+
+
+@register('performance', deploy=True)
+def check_performance(app_configs, **kwargs):
+    """ manage.py check --deploy: выключенные опции производительности. """
+    return [
+        Warning(f'Не включено: {name}.', hint=detail, id=check_id)
+        for check_id, name, active, detail in performance_options()
+        if not active
+    ]
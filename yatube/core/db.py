@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.dispatch import receiver
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """
+    CONN_HEALTH_CHECKS: соединение, оставшееся от прошлого запроса,
+    проверяется до начала нового; оборванное закрывается и будет
+    открыто заново, а не сломает запрос.
+    """
+    if not settings.CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
@@ -0,0 +1,325 @@
+import json
+import os
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+
+NAMESPACES = ('posts', 'users', 'about')
+# Аргументы generate_dataset для каждого масштаба.
+SCALES = {
+    'tiny': {'users': 50, 'posts': 500, 'comments': 1500, 'groups': 5},
+    'small': {'users': 1000, 'posts': 20000, 'comments': 60000},
+    'medium': {'users': 10000, 'posts': 200000, 'comments': 600000},
+    'large': {
+        'users': 100000, 'posts': 2000000, 'comments': 6000000,
+        'skip_feeds': True,
+    },
+}
+VARIANTS = ('anonymous', 'user')
+BASELINE_RUNS = 5
+
+
+def percentile(values, share):
+    """ Перцентиль по ближайшему рангу. """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(share * len(ordered)) - 1))
+    return ordered[index]
+
+
+def rss_kb():
+    """
+    Текущая резидентная память процесса; None вне Linux. Пик ru_maxrss
+    не годится: он общий на процесс и только растёт от маршрута
+    к маршруту.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def routes():
+    """ Имена и параметры всех маршрутов posts, users и about. """
+    for resolver in get_resolver().url_patterns:
+        if getattr(resolver, 'namespace', None) not in NAMESPACES:
+            continue
+        for pattern in resolver.url_patterns:
+            if pattern.name:
+                yield (
+                    f'{resolver.namespace}:{pattern.name}',
+                    tuple(pattern.pattern.converters)
+                )
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон всех маршрутов posts, users и about на '
+        'сгенерированных данных: перцентили задержки, пропускная '
+        'способность, число запросов к БД и прирост памяти. Без '
+        '--warm-cache кэш сбрасывается перед каждым запросом. '
+        'Результаты дописываются в историю; регрессия относительно '
+        'прошлых прогонов с тем же режимом кэша завершает команду '
+        'с ошибкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', nargs='+', default=['small'], choices=SCALES,
+            help='Масштабы данных; для каждого создаётся своя тестовая БД.'
+        )
+        parser.add_argument(
+            '--current-db', metavar='LABEL',
+            help='Прогнать на текущей БД без генерации данных.'
+        )
+        parser.add_argument(
+            '--routes', nargs='+', metavar='NAME',
+            help='Только эти маршруты, например posts:index.'
+        )
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--history', default=settings.BENCHMARK_HISTORY)
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Допустимый относительный рост p95.'
+        )
+        parser.add_argument(
+            '--min-delta', type=float, default=2.0,
+            help='Рост p95 в мс, меньше которого регрессией не считается.'
+        )
+        parser.add_argument(
+            '--fresh', action='store_true',
+            help='Пересоздать сохранённые БД масштабов.'
+        )
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Мерить попадания в кэш: кэш не сбрасывается.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        history = self.load_history()
+        failures = []
+        if options['current_db']:
+            runs = [(options['current_db'], self.measure())]
+        else:
+            runs = [
+                (scale, self.run_scale(scale)) for scale in options['scales']
+            ]
+        for scale, results in runs:
+            regressions = self.compare(history, scale, results)
+            history.append({
+                'date': timezone.now().isoformat(),
+                'revision': revision(),
+                'scale': scale,
+                'requests': options['requests'],
+                'cache': self.cache_mode(),
+                'results': results,
+                'regressions': regressions,
+            })
+            failures += [f'{scale} {line}' for line in regressions]
+        self.save_history(history)
+        if failures:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(failures)
+            )
+
+    def run_scale(self, scale):
+        """ Прогон на сохранённой между запусками БД масштаба. """
+        directory = os.path.dirname(self.options['history'])
+        os.makedirs(directory, exist_ok=True)
+        if connection.vendor == 'sqlite':
+            name = os.path.join(directory, f'benchmark_{scale}.sqlite3')
+        else:
+            name = f'benchmark_{scale}'
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings.get('NAME')
+        test_settings['NAME'] = name
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=not self.options['fresh']
+        )
+        try:
+            if not Post.objects.exists():
+                self.stdout.write(f'Генерация данных масштаба {scale}')
+                call_command(
+                    'generate_dataset', stdout=self.stdout, **SCALES[scale]
+                )
+            return self.measure()
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=True
+            )
+            test_settings['NAME'] = old_test_name
+
+    def targets(self):
+        """ Самые тяжёлые объекты: на них маршруты нагружены сильнее всего. """
+        author = User.objects.order_by('-stats__followers_count').first()
+        reader = User.objects.order_by('-stats__following_count').first()
+        group = Group.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        post = Post.objects.order_by('-comments_count').first()
+        return reader, {
+            'username': author and author.username,
+            'slug': group and group.slug,
+            'post_id': post and post.pk,
+        }
+
+    def measure(self):
+        reader, values = self.targets()
+        results = {}
+        # Часть маршрутов пишет в БД (подписка, отписка): всё
+        # откатывается, чтобы прогоны были сравнимы.
+        with transaction.atomic():
+            for name, params in routes():
+                if any(values.get(param) is None for param in params):
+                    continue
+                if self.options['routes'] and (
+                    name not in self.options['routes']
+                ):
+                    continue
+                url = reverse(name, kwargs={
+                    param: values[param] for param in params
+                })
+                for variant in VARIANTS:
+                    results.setdefault(name, {})[variant] = self.measure_url(
+                        url, reader if variant == 'user' else None
+                    )
+                self.report(name, results[name])
+            transaction.set_rollback(True)
+        return results
+
+    def cache_mode(self):
+        return 'warm' if self.options['warm_cache'] else 'cold'
+
+    def measure_url(self, url, user):
+        client = Client()
+        cache.clear()
+        if user is not None:
+            client.force_login(user)
+        rss_before = rss_kb()
+        started = time.perf_counter()
+        cold = client.get(url)
+        cold_ms = (time.perf_counter() - started) * 1000
+        latencies = []
+        queries = []
+        rss = [rss_kb()]
+        for _ in range(self.options['requests']):
+            if not self.options['warm_cache']:
+                cache.clear()
+            if user is not None and '_auth_user_id' not in client.session:
+                client.force_login(user)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            rss.append(rss_kb())
+        total = sum(latencies) / 1000
+        return {
+            'status': cold.status_code,
+            'cold_ms': round(cold_ms, 3),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'rps': round(len(latencies) / total, 1) if total else None,
+            'queries': max(queries),
+            'rss_delta_kb': (
+                None if rss_before is None else max(rss) - rss_before
+            ),
+        }
+
+    def report(self, name, variants):
+        for variant, result in variants.items():
+            self.stdout.write(
+                f'{name:28} {variant:9} {result["status"]} '
+                f'p50 {result["p50_ms"]:8.2f} p95 {result["p95_ms"]:8.2f} '
+                f'p99 {result["p99_ms"]:8.2f} мс  {result["rps"]:8} rps  '
+                f'запросов {result["queries"]}  кэш {self.cache_mode()}'
+            )
+
+    def baseline(self, history, scale):
+        """
+        Медианы последних прогонов масштаба без регрессий с тем же
+        режимом кэша; старые прогоны без режима мерили тёплый кэш.
+        """
+        runs = [
+            run for run in history
+            if run['scale'] == scale and not run['regressions']
+            and run.get('cache', 'warm') == self.cache_mode()
+        ][-BASELINE_RUNS:]
+        baseline = {}
+        for run in runs:
+            for name, variants in run['results'].items():
+                for variant, result in variants.items():
+                    entry = baseline.setdefault((name, variant), {
+                        'p95_ms': [], 'queries': []
+                    })
+                    entry['p95_ms'].append(result['p95_ms'])
+                    entry['queries'].append(result['queries'])
+        return {
+            key: {
+                'p95_ms': statistics.median(entry['p95_ms']),
+                'queries': min(entry['queries']),
+            }
+            for key, entry in baseline.items()
+        }
+
+    def compare(self, history, scale, results):
+        baseline = self.baseline(history, scale)
+        regressions = []
+        for name, variants in results.items():
+            for variant, result in variants.items():
+                base = baseline.get((name, variant))
+                if base is None:
+                    continue
+                p95, base_p95 = result['p95_ms'], base['p95_ms']
+                if (
+                    p95 > base_p95 * (1 + self.options['threshold'])
+                    and p95 - base_p95 > self.options['min_delta']
+                ):
+                    regressions.append(
+                        f'{name} {variant}: p95 {base_p95} -> {p95} мс'
+                    )
+                if result['queries'] > base['queries']:
+                    regressions.append(
+                        f'{name} {variant}: запросов {base["queries"]} '
+                        f'-> {result["queries"]}'
+                    )
+        return regressions
+
+    def load_history(self):
+        try:
+            with open(self.options['history'], encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return []
+
+    def save_history(self, history):
+        os.makedirs(os.path.dirname(self.options['history']), exist_ok=True)
+        with open(self.options['history'], 'w', encoding='utf-8') as file:
+            json.dump(history, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,65 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Список снятых профилей запросов и самые горячие функции в них. '
+        'С --token печатает заголовок, включающий профилирование '
+        'PROFILE_MAX_FILES запросов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Только профили этого view.')
+        parser.add_argument(
+            '--last', type=int, default=20,
+            help='Сколько последних профилей показать и свести.'
+        )
+        parser.add_argument(
+            '--top', type=int, default=15,
+            help='Сколько функций показать в сводке.'
+        )
+        parser.add_argument('--token', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(f'X-Profile: {profiling.make_token()}')
+            return
+        loaded = [
+            profiling.load(name) + (name,) for name in profiling.profiles()
+        ]
+        if options['view']:
+            loaded = [
+                (meta, stacks, name) for meta, stacks, name in loaded
+                if meta['view'] == options['view']
+            ]
+        loaded = loaded[-options['last']:]
+        if not loaded:
+            self.stdout.write('Профилей нет.')
+            return
+        own = Counter()
+        inclusive = Counter()
+        for meta, stacks, name in loaded:
+            self.stdout.write(
+                f'{name}  {meta["method"]} {meta["path"]}  '
+                f'{meta["status"]}  {meta["duration_ms"]:.1f} мс  '
+                f'отсчётов {meta["samples"]}'
+            )
+            for stack, count in stacks.items():
+                frames = stack.split(';')
+                own[frames[-1]] += count
+                # Рекурсия не должна считать функцию дважды.
+                for frame in set(frames):
+                    inclusive[frame] += count
+        total = sum(own.values())
+        if not total:
+            return
+        self.stdout.write(f'\nСобственное время, всего отсчётов {total}:')
+        for frame, count in own.most_common(options['top']):
+            self.stdout.write(f'{100 * count / total:6.1f}%  {frame}')
+        self.stdout.write('\nС вложенными вызовами:')
+        for frame, count in inclusive.most_common(options['top']):
+            self.stdout.write(f'{100 * count / total:6.1f}%  {frame}')
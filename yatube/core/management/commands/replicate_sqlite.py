@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Заглушка репликации для локальной разработки: копирует файл '
+        'SQLite основной базы в реплики из DATABASE_REPLICAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять раз в столько секунд; без него — один раз.'
+        )
+
+    def handle(self, *args, **options):
+        aliases = [DEFAULT_DB_ALIAS] + settings.DATABASE_REPLICAS
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: DATABASE_REPLICA_URLS.')
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('Заглушка копирует только базы SQLite.')
+        while True:
+            started = time.monotonic()
+            replicas.replicate()
+            self.stdout.write(
+                f'Реплики обновлены за '
+                f'{(time.monotonic() - started) * 1000:.1f} мс'
+            )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
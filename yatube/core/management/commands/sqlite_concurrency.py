@@ -0,0 +1,185 @@
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db import transaction
+
+from posts.models import Comment, Post, User
+
+from .benchmark import SCALES, percentile
+
+ROLES = ('reader', 'writer')
+# Поведение SQLite без настройки: журнал отката, полный fsync,
+# отложенные транзакции без повторов.
+DEFAULT_OPTIONS = {
+    'timeout': 5,
+    'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+}
+
+
+def use_database(path, options):
+    """ В дочернем процессе: своё соединение с файлом бенчмарка. """
+    del connections[DEFAULT_DB_ALIAS]
+    connections.databases[DEFAULT_DB_ALIAS] = dict(
+        connections.databases[DEFAULT_DB_ALIAS], NAME=path, OPTIONS=options
+    )
+
+
+def seed(path, options, dataset):
+    use_database(path, options)
+    call_command('migrate', verbosity=0)
+    call_command('generate_dataset', stdout=StringIO(), **dataset)
+    connections.close_all()
+
+
+def prepare(path, options):
+    """ Режим журнала переключается одним соединением до нагрузки. """
+    use_database(path, options)
+    connections[DEFAULT_DB_ALIAS].ensure_connection()
+    connections.close_all()
+
+
+def read(rng, posts, users):
+    """ Лента и комментарии к посту, как на главной и странице поста. """
+    list(Post.objects.select_related('author', 'group')[:10])
+    list(Comment.objects.filter(post_id=rng.choice(posts))[:20])
+
+
+def write(rng, posts, users):
+    """ Комментарий в транзакции: сначала чтение поста, потом запись. """
+    with transaction.atomic():
+        post = Post.objects.get(pk=rng.choice(posts))
+        Comment.objects.create(
+            post=post, author_id=rng.choice(users), text='benchmark'
+        )
+
+
+def work(role, path, options, duration, start, results):
+    latencies = []
+    errors = 0
+    # Медленные запросы здесь — ожидание блокировок, их и так видно
+    # в задержках.
+    logging.getLogger('core.queries').setLevel(logging.ERROR)
+    try:
+        use_database(path, options)
+        rng = random.Random(os.getpid())
+        posts = list(Post.objects.values_list('pk', flat=True))
+        users = list(User.objects.values_list('pk', flat=True))
+        operation = read if role == 'reader' else write
+        start.wait()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                operation(rng, posts, users)
+            except OperationalError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+        connections.close_all()
+    finally:
+        # Упавший процесс тоже отчитывается, иначе команда его ждёт.
+        results.put((role, latencies, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Смешанная нагрузка на SQLite из нескольких процессов: читатели '
+        'и писатели одновременно. Сравнивает настройки БД из DATABASES '
+        'с поведением SQLite по умолчанию: операции в секунду, '
+        'задержки и ошибки database is locked.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--duration', type=float, default=5.0,
+            help='Секунд нагрузки на каждый режим.'
+        )
+        parser.add_argument(
+            '--scale', default='tiny', choices=SCALES,
+            help='Объём данных для файла бенчмарка.'
+        )
+        parser.add_argument(
+            '--database', help='Файл БД; по умолчанию временный.'
+        )
+
+    def handle(self, *args, **options):
+        tuned = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if tuned['ENGINE'] != 'core.backends.sqlite3':
+            raise CommandError('Бенчмарк нужен только для SQLite.')
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            path = options['database'] or os.path.join(
+                directory, 'concurrency.sqlite3'
+            )
+            if not os.path.exists(path):
+                self.stdout.write(
+                    f'Генерация данных масштаба {options["scale"]}'
+                )
+                self.call(context, seed, path, tuned['OPTIONS'],
+                          SCALES[options['scale']])
+            for mode, mode_options in (
+                ('default', DEFAULT_OPTIONS), ('tuned', tuned['OPTIONS'])
+            ):
+                self.call(context, prepare, path, mode_options)
+                self.report(mode, self.run(
+                    context, path, mode_options, options
+                ), options['duration'])
+
+    def call(self, context, target, *args):
+        """ Подготовка БД в отдельном процессе, как и нагрузка. """
+        process = context.Process(target=target, args=args)
+        process.start()
+        process.join()
+        if process.exitcode:
+            raise CommandError(f'Не удалось выполнить {target.__name__}.')
+
+    def run(self, context, path, mode_options, options):
+        start = context.Event()
+        results = context.Queue()
+        processes = [
+            context.Process(target=work, args=(
+                role, path, mode_options, options['duration'], start, results
+            ))
+            for role in ROLES
+            for _ in range(options[f'{role}s'])
+        ]
+        for process in processes:
+            process.start()
+        start.set()
+        # Очередь разбирается до join: иначе процесс с большим
+        # результатом не завершится.
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        return collected
+
+    def report(self, mode, collected, duration):
+        for role in ROLES:
+            latencies = []
+            errors = 0
+            for name, values, failed in collected:
+                if name == role:
+                    latencies += values
+                    errors += failed
+            if not latencies:
+                self.stdout.write(
+                    f'{mode:8} {role:7} операций 0  ошибок {errors}'
+                )
+                continue
+            self.stdout.write(
+                f'{mode:8} {role:7} {len(latencies) / duration:9.1f} оп/с  '
+                f'p50 {percentile(latencies, 0.50):7.2f} '
+                f'p99 {percentile(latencies, 0.99):7.2f} мс  '
+                f'ошибок {errors}'
+            )
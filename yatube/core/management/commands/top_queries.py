@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from core import queries
+
+ORDERS = {
+    'total': lambda item: item['total'],
+    'count': lambda item: item['count'],
+    'max': lambda item: item['max'],
+    'mean': lambda item: item['total'] / item['count'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Самые тяжёлые запросы к БД по отпечаткам SQL из всех процессов: '
+        'число, суммарное, среднее и максимальное время, view.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--order', choices=ORDERS, default='total')
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Очистить накопленную статистику.'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            queries.reset()
+            self.stdout.write('Статистика запросов очищена.')
+            return
+        stats = sorted(
+            queries.collect().items(),
+            key=lambda pair: ORDERS[options['order']](pair[1]),
+            reverse=True
+        )[:options['limit']]
+        if not stats:
+            self.stdout.write('Запросов не записано.')
+            return
+        for rank, (sql, item) in enumerate(stats, 1):
+            views = ', '.join(
+                f'{view} ({count})'
+                for view, count in item['views'].most_common(3)
+            )
+            self.stdout.write(
+                f'{rank}. {item["count"]} раз, всего '
+                f'{item["total"] * 1000:.1f} мс, в среднем '
+                f'{item["total"] / item["count"] * 1000:.2f} мс, максимум '
+                f'{item["max"] * 1000:.2f} мс; view: {views}\n'
+                f'   {sql}\n'
+                f'   Параметры самого долгого: {item["example"]}'
+            )
@@ -0,0 +1,319 @@
+import glob
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+HEADER = struct.Struct('i4x')
+LENGTH = struct.Struct('i')
+VALUE = struct.Struct('d')
+INITIAL_SIZE = 64 * 1024
+LATENCY_BUCKETS = (
+    .005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_files = {}
+_registry = []
+
+
+def _read(data):
+    """ Пары (ключ, значение, смещение значения) из байтов файла. """
+    used = HEADER.unpack_from(data, 0)[0] if len(data) >= HEADER.size else 0
+    position = HEADER.size
+    while position < used:
+        length = LENGTH.unpack_from(data, position)[0]
+        key = data[position + LENGTH.size:position + LENGTH.size + length]
+        position += LENGTH.size + length
+        position += -position % VALUE.size
+        yield key.decode(), VALUE.unpack_from(data, position)[0], position
+        position += VALUE.size
+
+
+class ValueFile:
+    """
+    Значения метрик одного процесса в файле, отображённом в память.
+    Запись дописывается целиком до сдвига счётчика занятых байт,
+    поэтому читатели из других процессов видят согласованный префикс.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self.file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.used = HEADER.unpack_from(self.map, 0)[0] or HEADER.size
+        self.positions = {
+            key: position for key, _, position in _read(self.map)
+        }
+
+    def _append(self, key):
+        encoded = key.encode()
+        padding = -(self.used + LENGTH.size + len(encoded)) % VALUE.size
+        entry = (
+            LENGTH.pack(len(encoded)) + encoded + b'\0' * padding
+            + VALUE.pack(0)
+        )
+        end = self.used + len(entry)
+        if end > len(self.map):
+            self.map.resize(max(end, 2 * len(self.map)))
+        self.map[self.used:end] = entry
+        self.positions[key] = end - VALUE.size
+        self.used = end
+        HEADER.pack_into(self.map, 0, end)
+
+    def add(self, key, amount):
+        position = self.positions.get(key)
+        if position is None:
+            self._append(key)
+            position = self.positions[key]
+        value = VALUE.unpack_from(self.map, position)[0]
+        VALUE.pack_into(self.map, position, value + amount)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def _file(kind):
+    """ Файл текущего процесса; после fork дочерний заводит свой. """
+    key = (kind, os.getpid())
+    values = _files.get(key)
+    if values is None:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        values = _files[key] = ValueFile(
+            os.path.join(settings.METRICS_DIR, f'{kind}_{os.getpid()}.db')
+        )
+    return values
+
+
+def _add(kind, key, amount):
+    with _lock:
+        _file(kind).add(key, amount)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"'
+                          for name, value in pairs) + '}'
+
+
+class Metric:
+    kind = 'counter'
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.keys = {}
+        _registry.append(self)
+
+    def key(self, suffix, values, extra=''):
+        """ Ключ выборки в файле: имя и метки в текстовом формате. """
+        cache_key = (suffix, values, extra)
+        key = self.keys.get(cache_key)
+        if key is None:
+            pairs = list(zip(self.label_names, values))
+            if extra:
+                pairs.append(('le', extra))
+            key = self.keys[cache_key] = (
+                f'{self.name}{suffix}{_labels(pairs)}'
+            )
+        return key
+
+    def samples(self, values):
+        for key in sorted(values):
+            yield key, values[key]
+
+
+def _format(value):
+    return repr(float(value))
+
+
+class Counter(Metric):
+    def inc(self, *labels, amount=1):
+        _add(self.kind, self.key('', labels), amount)
+
+
+class Gauge(Metric):
+    """ Сумма по живым процессам: значения упавших отбрасываются. """
+    kind = 'gauge'
+    type = 'gauge'
+
+    def add(self, *labels, amount=1):
+        _add(self.kind, self.key('', labels), amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self.bounds = [_format(bound) for bound in self.buckets] + ['+Inf']
+
+    def observe(self, value, *labels):
+        for bound, label in zip(self.buckets, self.bounds):
+            if value <= bound:
+                break
+        else:
+            label = '+Inf'
+        with _lock:
+            values = _file(self.kind)
+            # В файле — попадания в корзину; накопленные суммы считает
+            # экспорт: на наблюдение три записи вместо числа корзин.
+            values.add(self.key('_bucket', labels, label), 1)
+            values.add(self.key('_sum', labels), value)
+            values.add(self.key('_count', labels), 1)
+
+    def samples(self, values):
+        # Ключ корзины: name_bucket{метки,le="x"}; метки вместе
+        # с открывающей скобкой и запятой — префикс до le.
+        series = defaultdict(dict)
+        prefix = f'{self.name}_bucket'
+        for key, value in values.items():
+            if key.startswith(prefix):
+                split = key.rindex('le="')
+                series[key[len(prefix):split]][key[split + 4:-2]] = value
+        for labels in sorted(series):
+            total = 0
+            for bound in self.bounds:
+                total += series[labels].get(bound, 0)
+                yield f'{prefix}{labels}le="{bound}"}}', total
+            plain = labels[:-1] + '}' if labels != '{' else ''
+            for suffix in ('_sum', '_count'):
+                key = f'{self.name}{suffix}{plain}'
+                yield key, values.get(key, 0)
+
+
+def collect():
+    """ Значения всех процессов: счётчики складываются целиком. """
+    totals = defaultdict(float)
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        kind, pid = os.path.basename(path)[:-3].split('_')
+        if kind == 'gauge' and not _alive(int(pid)):
+            continue
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            continue
+        for key, value, _ in _read(data):
+            totals[key] += value
+    return totals
+
+
+def exposition():
+    """ Все метрики в текстовом формате Prometheus. """
+    totals = collect()
+    by_name = defaultdict(dict)
+    for key, value in totals.items():
+        by_name[key.split('{', 1)[0]][key] = value
+    lines = []
+    for metric in _registry:
+        values = {}
+        for suffix in ('', '_bucket', '_sum', '_count'):
+            values.update(by_name.get(metric.name + suffix, {}))
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(
+            f'{key} {value!r}' for key, value in metric.samples(values)
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    """ Удаляет файлы всех процессов: при старте сервера и в тестах. """
+    with _lock:
+        for values in _files.values():
+            values.close()
+        _files.clear()
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+            os.remove(path)
+
+
+@receiver(setting_changed)
+def reset_files(setting, **kwargs):
+    if setting == 'METRICS_DIR':
+        with _lock:
+            for values in _files.values():
+                values.close()
+            _files.clear()
+
+
+REQUESTS = Counter(
+    'yatube_http_requests_total',
+    'Ответы по имени маршрута, методу и статусу.',
+    ('view', 'method', 'status')
+)
+LATENCY = Histogram(
+    'yatube_http_request_duration_seconds',
+    'Время обработки запроса по имени маршрута.',
+    ('view',), LATENCY_BUCKETS
+)
+QUERIES = Histogram(
+    'yatube_db_queries_per_request',
+    'Число запросов к БД за запрос по имени маршрута.',
+    ('view',), QUERY_BUCKETS
+)
+CACHE = Counter(
+    'yatube_cache_reads_total',
+    'Чтения ключей кэша по имени маршрута: hit или miss.',
+    ('view', 'result')
+)
+IN_FLIGHT = Gauge(
+    'yatube_http_requests_in_flight',
+    'Запросы, обрабатываемые прямо сейчас.'
+)
+THUMBNAILS = Counter(
+    'yatube_thumbnails_total',
+    'Нарезанные картинки постов: ok или error.',
+    ('result',)
+)
+RECOMPUTES = Counter(
+    'yatube_cache_recomputes_total',
+    'Пересчёты записей кэша: miss, stale, pinned или timeout ожидания.',
+    ('name', 'reason')
+)
+STALE = Counter(
+    'yatube_cache_stale_total',
+    'Отданные устаревшие записи, пока их пересчитывает другой воркер.',
+    ('name',)
+)
+COALESCED = Counter(
+    'yatube_cache_coalesced_total',
+    'Запросы, дождавшиеся пересчёта другого потока того же процесса.',
+    ('name',)
+)
+LOCK_WAIT = Histogram(
+    'yatube_cache_lock_wait_seconds',
+    'Ожидание чужого пересчёта записи кэша.',
+    ('name',), LATENCY_BUCKETS
+)
@@ -0,0 +1,63 @@
+import re
+from html import unescape
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+from django.urls import Resolver404, resolve, reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# Метка фрагмента в оболочке страницы — ESI include: её понимает
+# кэширующий прокси, а без него метки заменяет fill().
+MARKER = re.compile(rb'<esi:include src="([^"]*)"/>')
+
+_fragments = {}
+
+
+def fragment(name):
+    """
+    Регистрирует функцию, рисующую фрагмент name для текущего
+    пользователя: (request, params) -> HTML, params — строки.
+    """
+    def decorator(function):
+        _fragments[name] = function
+        return function
+    return decorator
+
+
+def exists(name):
+    return name in _fragments
+
+
+def render(request, name, params):
+    return mark_safe(_fragments[name](request, params))
+
+
+def marker(name, params):
+    """ Метка на месте фрагмента в общей для всех оболочке. """
+    src = reverse('fragment', args=[name])
+    if params:
+        src += '?' + urlencode(sorted(params.items()))
+    return mark_safe(f'<esi:include src="{escape(src)}"/>')
+
+
+def fill(content, request):
+    """ Подставляет в оболочку фрагменты пользователя из request. """
+    def replace(match):
+        path, _, query = unescape(match.group(1).decode()).partition('?')
+        try:
+            name = resolve(path).kwargs['name']
+        except (Resolver404, KeyError):
+            return match.group(0)
+        if not exists(name):
+            return match.group(0)
+        return render(request, name, dict(parse_qsl(query))).encode()
+    return MARKER.sub(replace, content)
+
+
+@fragment('header')
+def header(request, params):
+    return render_to_string(
+        'includes/header.html', {'view_name': params.get('view', '')},
+        request
+    )
@@ -0,0 +1,191 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+SALT = 'core.profiling'
+
+_names = {}
+
+
+def _slot(nonce, number):
+    return os.path.join(settings.PROFILE_DIR, 'armed', f'{nonce}.{number}')
+
+
+def make_token():
+    """
+    Значение заголовка, включающего профилирование: одно включение
+    на PROFILE_MAX_FILES запросов в течение PROFILE_TOKEN_MAX_AGE.
+    Включение — файлы-слоты в PROFILE_DIR: их видят все воркеры,
+    и команда profiles --token работает без общего кэша.
+    """
+    directory = os.path.join(settings.PROFILE_DIR, 'armed')
+    os.makedirs(directory, exist_ok=True)
+    expired = time.time() - settings.PROFILE_TOKEN_MAX_AGE
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+    nonce = uuid.uuid4().hex
+    for number in range(settings.PROFILE_MAX_FILES):
+        open(_slot(nonce, number), 'x').close()
+    return signing.TimestampSigner(salt=SALT).sign(nonce)
+
+
+def use_token(value):
+    """
+    Расходует слот включения: удаление файла атомарно, так что один
+    слот достаётся одному запросу. False — токен подделан, просрочен
+    или его слоты кончились.
+    """
+    try:
+        nonce = signing.TimestampSigner(salt=SALT).unsign(
+            value, max_age=settings.PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    for number in range(settings.PROFILE_MAX_FILES):
+        try:
+            os.remove(_slot(nonce, number))
+        except FileNotFoundError:
+            continue
+        return True
+    return False
+
+
+def frame_name(code):
+    """ Функция и её файл: короче внутри проекта и site-packages. """
+    name = _names.get(code)
+    if name is None:
+        path = code.co_filename
+        if path.startswith(settings.BASE_DIR):
+            path = os.path.relpath(path, settings.BASE_DIR)
+        elif 'site-packages' in path:
+            path = path.split('site-packages' + os.sep, 1)[1]
+        name = _names[code] = (
+            f'{code.co_name} ({path}:{code.co_firstlineno})'
+        )
+    return name
+
+
+class Sampler(threading.Thread):
+    """ Снимает стек потока запроса раз в interval секунд. """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.stacks
+
+
+def save(stacks, meta):
+    """
+    Свёрнутые стеки (формат flamegraph.pl и speedscope) и описание
+    запроса рядом в JSON; возвращает имя профиля.
+    """
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = '-'.join((
+        timezone.now().strftime('%Y%m%d-%H%M%S'),
+        meta['view'].replace(':', '.'),
+        uuid.uuid4().hex[:8],
+    ))
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with open(f'{path}.folded', 'w', encoding='utf-8') as file:
+        for stack, count in stacks.most_common():
+            file.write(f'{stack} {count}\n')
+    with open(f'{path}.json', 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False)
+    return name
+
+
+def load(name):
+    """ Описание профиля и его стеки. """
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with open(f'{path}.json', encoding='utf-8') as file:
+        meta = json.load(file)
+    stacks = Counter()
+    with open(f'{path}.folded', encoding='utf-8') as file:
+        for line in file:
+            stack, count = line.rstrip('\n').rsplit(' ', 1)
+            stacks[stack] += int(count)
+    return meta, stacks
+
+
+def profiles():
+    """ Имена сохранённых профилей, от старых к новым. """
+    try:
+        files = os.listdir(settings.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-5] for name in files if name.endswith('.json'))
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос с подписанным заголовком X-Profile или
+    случайную долю запросов к view из PROFILE_SAMPLING.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.armed(request):
+            return None
+        request.profile_sampler = Sampler(
+            threading.get_ident(), settings.PROFILE_INTERVAL
+        )
+        request.profile_started = (timezone.now(), time.perf_counter())
+        request.profile_sampler.start()
+        return None
+
+    def armed(self, request):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token is not None:
+            return use_token(token)
+        view = request.resolver_match.view_name
+        share = settings.PROFILE_SAMPLING.get(view)
+        return share is not None and random.random() < share
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        sampler = getattr(request, 'profile_sampler', None)
+        if sampler is None:
+            return response
+        stacks = sampler.stop()
+        started, counter = request.profile_started
+        response['X-Profile-Id'] = save(stacks, {
+            'view': request.resolver_match.view_name,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'started': started.isoformat(),
+            'duration_ms': round((time.perf_counter() - counter) * 1000, 3),
+            'interval_ms': settings.PROFILE_INTERVAL * 1000,
+            'samples': sum(stacks.values()),
+        })
+        return response
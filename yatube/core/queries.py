@@ -0,0 +1,208 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .timing import current_view
+
+logger = logging.getLogger(__name__)
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'(?<![\w."])-?\b\d+(?:\.\d+)?\b')
+PLACEHOLDERS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+SAVEPOINT = re.compile(r'(SAVEPOINT\s+)"?\w+"?')
+SPACE = re.compile(r'\s+')
+EXAMPLE_LENGTH = 300
+
+_lock = threading.Lock()
+# Запись файла — вне _lock: запросы других потоков её не ждут.
+_write_lock = threading.Lock()
+_state = threading.local()
+_stats = {}
+_flushed = time.monotonic()
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    SQL без литералов: строки, числа и имена точек сохранения
+    заменены на ?, списки параметров IN (%s, %s, ...) и строки
+    VALUES свёрнуты — одинаковые запросы с разными значениями дают
+    один отпечаток.
+    """
+    sql = SAVEPOINT.sub(r'\1?', sql)
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = PLACEHOLDERS.sub('(...)', sql)
+    sql = ROWS.sub('(...)', sql)
+    return SPACE.sub(' ', sql).strip()
+
+
+def param_types(params):
+    """
+    Типы параметров без значений: в значениях бывают ключи и данные
+    сессий, хэши паролей и адреса почты.
+    """
+    if isinstance(params, dict):
+        items = islice(sorted(params.items()), 20)
+        return '{%s}' % ', '.join(
+            f'{name}: {type(value).__name__}' for name, value in items
+        )
+    return '(%s)' % ', '.join(
+        type(value).__name__ for value in islice(params or (), 20)
+    )
+
+
+def explain(connection, sql, params):
+    """ План запроса; сам EXPLAIN в журнал и статистику не пишется. """
+    _state.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix()} {sql}', params
+            )
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except DatabaseError as error:
+        return f'EXPLAIN не удался: {error}'
+    finally:
+        _state.explaining = False
+
+
+def record(execute, sql, params, many, context):
+    if getattr(_state, 'explaining', False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    view = current_view() or '-'
+    observe(
+        fingerprint(sql), duration,
+        '(executemany)' if many else params, view
+    )
+    if duration >= settings.SLOW_QUERY_THRESHOLD:
+        connection = context['connection']
+        plan = ''
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            plan = explain(connection, sql, params)
+        logger.warning(
+            'Медленный запрос %.1f мс view=%s db=%s\n%s\nПараметры: %s\n%s',
+            duration * 1000, view, connection.alias, sql,
+            param_types(params) if not many else '(executemany)', plan
+        )
+    return result
+
+
+def observe(key, duration, params, view):
+    global _flushed
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            if len(_stats) >= settings.QUERY_STATS_MAX_FINGERPRINTS:
+                return
+            stats = _stats[key] = {
+                'count': 0, 'total': 0.0, 'max': 0.0, 'example': None,
+                'views': Counter(),
+            }
+        stats['count'] += 1
+        stats['total'] += duration
+        stats['views'][view] += 1
+        if duration >= stats['max']:
+            stats['max'] = duration
+            stats['example'] = (
+                params if isinstance(params, str) else param_types(params)
+            )[:EXAMPLE_LENGTH]
+        due = time.monotonic() - _flushed >= settings.QUERY_STATS_INTERVAL
+        if due:
+            _flushed = time.monotonic()
+    if due:
+        _write()
+
+
+def _write():
+    """ Снимок статистики под _lock, сериализация и запись — после. """
+    with _write_lock:
+        with _lock:
+            snapshot = {
+                key: dict(stats, views=dict(stats['views']))
+                for key, stats in _stats.items()
+            }
+        os.makedirs(settings.QUERY_STATS_DIR, exist_ok=True)
+        path = os.path.join(settings.QUERY_STATS_DIR, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file, ensure_ascii=False)
+        os.replace(f'{path}.tmp', path)
+
+
+@atexit.register
+def flush():
+    """ Сбрасывает статистику процесса в его файл. """
+    with _lock:
+        empty = not _stats
+    if not empty:
+        _write()
+
+
+def collect():
+    """ Статистика всех процессов, сведённая по отпечаткам. """
+    flush()
+    merged = {}
+    for path in glob.glob(os.path.join(settings.QUERY_STATS_DIR, '*.json')):
+        try:
+            with open(path, encoding='utf-8') as file:
+                stats = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for key, item in stats.items():
+            total = merged.setdefault(key, {
+                'count': 0, 'total': 0.0, 'max': 0.0, 'example': None,
+                'views': Counter(),
+            })
+            total['count'] += item['count']
+            total['total'] += item['total']
+            total['views'].update(item['views'])
+            if item['max'] >= total['max']:
+                total['max'] = item['max']
+                total['example'] = item['example']
+    return merged
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        for path in glob.glob(
+            os.path.join(settings.QUERY_STATS_DIR, '*.json')
+        ):
+            os.remove(path)
+
+
+def install(connection):
+    # В начало списка: execute_wrapper() снимает обёртки с конца, и
+    # подключение внутри такого блока не должно сбросить эту.
+    if record not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record)
+
+
+@receiver(connection_created)
+def install_on_connect(connection, **kwargs):
+    install(connection)
+
+
+@receiver(setting_changed)
+def reset_stats(setting, **kwargs):
+    if setting == 'QUERY_STATS_DIR':
+        with _lock:
+            _stats.clear()
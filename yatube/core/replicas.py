@@ -0,0 +1,134 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Cookie «недавно писал»: пока она жива, чтения идут в основную базу.
+PIN_COOKIE = 'db_primary'
+WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_state = ContextVar('replica_state', default=None)
+
+
+class State:
+    __slots__ = ('pinned', 'wrote', 'alias')
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+        # Реплика для чтений; None — основная база.
+        self.alias = None
+
+
+def replica_reads(view):
+    """
+    Чтения view идут на случайную реплику из DATABASE_REPLICAS, если
+    сессия не закреплена за основной базой после записи.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if (
+            state is None or state.pinned
+            or not settings.DATABASE_REPLICAS
+        ):
+            return view(request, *args, **kwargs)
+        state.alias = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.alias = None
+    return wrapper
+
+
+@contextmanager
+def primary():
+    """ Чтения внутри блока идут в основную базу. """
+    state = _state.get()
+    alias = state and state.alias
+    if state is not None:
+        state.alias = None
+    try:
+        yield
+    finally:
+        if state is not None:
+            state.alias = alias
+
+
+class ReplicaRouter:
+    """
+    Запись — всегда в основную базу; чтение — на реплику, выбранную
+    replica_reads, пока запрос сам ничего не записал.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        # Сессия, только что созданная входом, могла не дойти до
+        # реплики: пользователь оказался бы разлогинен.
+        if (
+            state is None or state.wrote
+            or model._meta.app_label == 'sessions'
+        ):
+            return None
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы: связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему на реплики переносит репликация.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """
+    После запроса с записью закрепляет сессию за основной базой на
+    REPLICA_PIN_SECONDS: свои изменения видны сразу, а не после
+    того, как их догонит реплика.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = State(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+
+        def track(execute, sql, params, many, context):
+            # db_for_write Django зовёт и без записи, например при
+            # присваивании связи: запись видна только по самому SQL.
+            if sql.lstrip()[:7].upper().startswith(WRITES):
+                state.wrote = True
+            return execute(sql, params, many, context)
+
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(track):
+                response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def replicate(source=DEFAULT_DB_ALIAS, targets=None):
+    """
+    Заглушка репликации для SQLite: копирует базу source в реплики
+    целиком через online backup. Для PostgreSQL реплики ведёт сервер.
+    """
+    source = connections[source]
+    source.ensure_connection()
+    for alias in settings.DATABASE_REPLICAS if targets is None else targets:
+        target = connections[alias]
+        target.ensure_connection()
+        source.connection.backup(target.connection)
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import metrics
+
+# Пауза между проверками, готов ли чужой пересчёт.
+POLL_INTERVAL = 0.02
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'failed')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class SingleFlight:
+    """
+    Одно вычисление ключа на процесс: потоки, пришедшие за тем же
+    ключом, ждут результат первого вместо собственного пересчёта.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def do(self, key, compute, name=''):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+        if not leader:
+            metrics.COALESCED.inc(name)
+            flight.done.wait()
+            # Ошибку первого не разделяем: пусть каждый получит свою.
+            return compute() if flight.failed else flight.value
+        try:
+            flight.value = compute()
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.value
+
+
+_flights = SingleFlight()
+
+
+def _lock_key(key):
+    return f'lock:{key}'
+
+
+def _store(key, value, soft_timeout, timeout):
+    # None не кэшируется: например, страница с ошибкой.
+    if value is not None:
+        cache.set(key, (time.time() + soft_timeout, value), timeout)
+    return value
+
+
+def _compute(key, compute, soft_timeout, timeout, name, reason):
+    """ Пересчёт под блокировкой, снимаемой по окончании. """
+    metrics.RECOMPUTES.inc(name, reason)
+    try:
+        return _store(key, compute(), soft_timeout, timeout)
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def _fill(key, compute, soft_timeout, timeout, name):
+    """ Записи нет: пересчитывает держатель блокировки, прочие ждут. """
+    started = time.monotonic()
+    waited = None
+    while not cache.add(_lock_key(key), 1, settings.CACHE_LOCK_TIMEOUT):
+        waited = time.monotonic() - started
+        entry = cache.get(key)
+        if entry is not None:
+            metrics.LOCK_WAIT.observe(waited, name)
+            return entry[1]
+        if waited > settings.CACHE_LOCK_WAIT:
+            # Держатель завис или медлит: считаем сами, без блокировки.
+            metrics.LOCK_WAIT.observe(waited, name)
+            metrics.RECOMPUTES.inc(name, 'timeout')
+            return _store(key, compute(), soft_timeout, timeout)
+        time.sleep(POLL_INTERVAL)
+    if waited is not None:
+        metrics.LOCK_WAIT.observe(time.monotonic() - started, name)
+    return _compute(key, compute, soft_timeout, timeout, name, 'miss')
+
+
+def get_or_compute(key, compute, soft_timeout, timeout, is_fresh=None,
+                   name='', allow_stale=True):
+    """
+    Значение из кэша с мягким и жёстким сроком. До soft_timeout
+    запись свежая (если is_fresh её не отверг); после — устаревшая:
+    её пересчитывает один воркер под блокировкой в кэше, остальные
+    тем временем отдают старое значение. Через timeout запись
+    исчезает, и за неё снова соревнуются через блокировку.
+    С allow_stale=False устаревшее значение не отдаётся: при чужой
+    блокировке значение считается без неё.
+    compute() возвращает None для значения, которое не кэшируется.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        stale_after, value = entry
+        if time.time() < stale_after and (
+            is_fresh is None or is_fresh(value)
+        ):
+            return value
+        if not cache.add(_lock_key(key), 1, settings.CACHE_LOCK_TIMEOUT):
+            if allow_stale:
+                metrics.STALE.inc(name)
+                return value
+            metrics.RECOMPUTES.inc(name, 'pinned')
+            return _store(key, compute(), soft_timeout, timeout)
+        return _compute(key, compute, soft_timeout, timeout, name, 'stale')
+    return _flights.do(
+        key, lambda: _fill(key, compute, soft_timeout, timeout, name), name
+    )
@@ -0,0 +1,21 @@
+from django import template
+
+from core import personal as fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name, **params):
+    """
+    Часть страницы, зависящая от пользователя. В оболочке для
+    страничного кэша вместо неё — метка, заполняемая на каждый запрос.
+    """
+    params = {
+        key: '' if value is None else str(value)
+        for key, value in params.items()
+    }
+    request = context['request']
+    if getattr(request, 'page_shell', False):
+        return fragments.marker(name, params)
+    return fragments.render(request, name, params)
@@ -1,5 +1,30 @@
-from django.test import TestCase, Client
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.shortcuts import render
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import checks, metrics, profiling, queries, replicas, revalidate
+from core.backends.sqlite3.base import DatabaseWrapper
+from core.cache import NearCache, dumps
+from posts.models import Follow, Post, User
 
 
 class ViewTestClass(TestCase):
@@ -13,3 +38,746 @@ class ViewTestClass(TestCase):
     def test_error_page_uses_correct_template(self):
         response = self.guest_client.get('core/404.html')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(SERVER_TIMING=True)
+class RequestTimingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Timer')
+        Post.objects.create(author=self.user, text='Пост')
+
+    def timing(self, response):
+        return {
+            metric.split(';')[0]: metric
+            for metric in response['Server-Timing'].split(', ')
+        }
+
+    def test_header_and_log_line(self):
+        client = Client()
+        client.force_login(self.user)
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = client.get(reverse('posts:index'))
+        timing = self.timing(response)
+        self.assertEqual(
+            set(timing), {'total', 'db', 'cache', 'template'}
+        )
+        self.assertRegex(
+            timing['db'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"'
+        )
+        self.assertIn('view=posts:index method=GET status=200', logs.output[0])
+
+    def test_cache_hits_and_misses(self):
+        url = reverse('posts:index')
+        first = self.timing(self.client.get(url))
+        self.assertNotIn('desc="0 hits 0 misses"', first['cache'])
+        self.assertNotIn('desc="0 queries"', first['db'])
+        second = self.timing(self.client.get(url))
+        self.assertIn('desc="0 queries"', second['db'])
+        self.assertRegex(second['cache'], r'desc="[1-9]\d* hits 0 misses"')
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_can_be_disabled(self):
+        response = self.client.get(reverse('about:tech'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(SERVER_TIMING='staff')
+    def test_header_for_staff_only(self):
+        url = reverse('about:tech')
+        self.assertFalse(self.client.get(url).has_header('Server-Timing'))
+        self.client.force_login(self.user)
+        self.assertFalse(self.client.get(url).has_header('Server-Timing'))
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.client.get(url).has_header('Server-Timing'))
+
+
+def child_requests(directory):
+    with override_settings(METRICS_DIR=directory):
+        metrics.REQUESTS.inc('posts:index', 'GET', 200, amount=2)
+        metrics.IN_FLIGHT.add(amount=5)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = override_settings(METRICS_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.directory = directory
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.scrape()
+        self.assertIn(
+            'yatube_http_requests_total'
+            '{view="posts:index",method="GET",status="200"} 2.0', text
+        )
+        self.assertIn(
+            'yatube_http_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2.0', text
+        )
+        self.assertIn(
+            'yatube_http_request_duration_seconds_count'
+            '{view="posts:index"} 2.0', text
+        )
+        self.assertIn('yatube_db_queries_per_request_bucket', text)
+        self.assertIn(
+            'yatube_cache_reads_total{view="posts:index",result="hit"}', text
+        )
+        # Учтён и сам запрос экспорта: он ещё обрабатывается.
+        self.assertIn('yatube_http_requests_in_flight 1.0', text)
+        self.assertIn('# TYPE yatube_thumbnails_total counter', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (0.001, 0.02, 0.02, 30):
+            metrics.LATENCY.observe(value, 'test')
+        text = self.scrape()
+        for bound, count in (('0.005', 1), ('0.025', 3), ('10.0', 3),
+                             ('+Inf', 4)):
+            self.assertIn(
+                'yatube_http_request_duration_seconds_bucket'
+                f'{{view="test",le="{bound}"}} {count}.0', text
+            )
+        self.assertIn(
+            'yatube_http_request_duration_seconds_sum{view="test"} 30.041',
+            text
+        )
+
+    def test_processes_are_aggregated(self):
+        metrics.REQUESTS.inc('posts:index', 'GET', 200)
+        context = multiprocessing.get_context('fork')
+        for _ in range(2):
+            child = context.Process(
+                target=child_requests, args=(self.directory,)
+            )
+            child.start()
+            child.join()
+        totals = metrics.collect()
+        self.assertEqual(totals[
+            'yatube_http_requests_total'
+            '{view="posts:index",method="GET",status="200"}'
+        ], 5)
+        # Значения завершившихся процессов у датчиков отброшены.
+        self.assertEqual(totals['yatube_http_requests_in_flight'], 0)
+
+    def test_only_allowed_addresses(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+def slow_render(*args, **kwargs):
+    time.sleep(0.05)
+    return render(*args, **kwargs)
+
+
+@override_settings(PROFILE_INTERVAL=0.002)
+class ProfilingTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = override_settings(PROFILE_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='Profiler')
+        self.client.force_login(self.user)
+        patcher = mock.patch('posts.views.render', slow_render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_signed_header_captures_profile(self):
+        url = reverse('posts:follow_index')
+        response = self.client.get(url, HTTP_X_PROFILE=profiling.make_token())
+        name = response['X-Profile-Id']
+        self.assertEqual(profiling.profiles(), [name])
+        meta, stacks = profiling.load(name)
+        self.assertEqual(meta['view'], 'posts:follow_index')
+        self.assertEqual(meta['status'], HTTPStatus.OK)
+        self.assertGreater(meta['samples'], 5)
+        self.assertTrue(any(
+            'follow_index (posts/views.py' in stack
+            and stack.split(';')[-1].startswith('slow_render (core/tests.py')
+            for stack in stacks
+        ))
+
+    @override_settings(PROFILE_MAX_FILES=2)
+    def test_token_profiles_limited_number_of_requests(self):
+        url = reverse('posts:follow_index')
+        token = profiling.make_token()
+        for _ in range(3):
+            response = self.client.get(url, HTTP_X_PROFILE=token)
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(len(profiling.profiles()), 2)
+        response = self.client.get(
+            url, HTTP_X_PROFILE=profiling.make_token()
+        )
+        self.assertTrue(response.has_header('X-Profile-Id'))
+
+    def test_forged_header_is_ignored(self):
+        response = self.client.get(
+            reverse('posts:follow_index'), HTTP_X_PROFILE='profile:forged'
+        )
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(profiling.profiles(), [])
+
+    def test_sampled_view_and_command(self):
+        with override_settings(PROFILE_SAMPLING={'posts:profile': 1.0}):
+            self.client.get(reverse('posts:index'))
+            self.client.get(
+                reverse('posts:profile', args=(self.user.username,))
+            )
+        self.assertEqual(len(profiling.profiles()), 1)
+        out = StringIO()
+        call_command('profiles', view='posts:profile', stdout=out)
+        self.assertIn('GET /profile/Profiler/', out.getvalue())
+        self.assertIn('slow_render (core/tests.py', out.getvalue())
+
+
+class QueryLogTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = override_settings(QUERY_STATS_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='Reader')
+
+    def test_fingerprint_strips_literals(self):
+        self.assertEqual(
+            queries.fingerprint(
+                "SELECT * FROM t WHERE a = 'x''y' AND b IN (%s, %s, %s)\n"
+                'LIMIT 10 OFFSET 20'
+            ),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ? OFFSET ?'
+        )
+        self.assertEqual(
+            queries.fingerprint('SELECT "T2"."id" FROM "t" T2 LIMIT 21'),
+            'SELECT "T2"."id" FROM "t" T2 LIMIT ?'
+        )
+        self.assertEqual(
+            queries.fingerprint(
+                'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'
+            ),
+            'INSERT INTO t (a, b) VALUES (...)'
+        )
+        self.assertEqual(
+            queries.fingerprint('RELEASE SAVEPOINT "s1407_x3"'),
+            'RELEASE SAVEPOINT ?'
+        )
+
+    def test_aggregates_by_fingerprint_and_view(self):
+        User.objects.create_user(username='Writer')
+        self.client.force_login(self.user)
+        for username in ('Reader', 'Writer'):
+            self.client.get(reverse('posts:profile', args=(username,)))
+        stats = [
+            item for sql, item in queries.collect().items()
+            if sql.startswith('SELECT') and 'FROM "posts_follow"' in sql
+        ]
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['views']['posts:profile'], 2)
+        out = StringIO()
+        call_command('top_queries', order='count', stdout=out)
+        self.assertIn('posts:profile (', out.getvalue())
+        call_command('top_queries', reset=True, stdout=StringIO())
+        self.assertEqual(queries.collect(), {})
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_slow_query_is_logged_with_plan(self):
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            Post.objects.filter(author=self.user).exists()
+        self.assertIn('Медленный запрос', logs.output[0])
+        self.assertIn('posts_post', logs.output[0])
+        self.assertRegex(logs.output[0], r'SEARCH|SCAN|Scan')
+
+    def test_parameter_values_are_not_recorded(self):
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            with override_settings(SLOW_QUERY_THRESHOLD=0):
+                User.objects.filter(email='secret@example.com').exists()
+        self.assertNotIn('secret@example.com', logs.output[0])
+        self.assertIn('Параметры: (str', logs.output[0])
+        examples = [item['example'] for item in queries.collect().values()]
+        self.assertNotIn('secret', repr(examples))
+        self.assertIn('(str)', examples)
+
+
+class PerformanceSettingsTest(TestCase):
+    def test_report_marks_active_options(self):
+        templates = [{
+            **settings.TEMPLATES[0], 'APP_DIRS': False,
+            'OPTIONS': {**settings.TEMPLATES[0]['OPTIONS'], 'loaders': [
+                (checks.CACHED_LOADER, [
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ]},
+        }]
+        with override_settings(TEMPLATES=templates, CONN_HEALTH_CHECKS=True):
+            report = checks.report()
+        self.assertIn('[+] кэширующий загрузчик шаблонов', '\n'.join(report))
+        self.assertIn(
+            '[+] проверка соединений перед запросом', '\n'.join(report)
+        )
+        self.assertIn(
+            '[+] SQLite: журнал WAL и транзакции IMMEDIATE', '\n'.join(report)
+        )
+
+    @override_settings(THUMBNAIL_WORKERS=0, CONN_HEALTH_CHECKS=False)
+    def test_deploy_check_warns_about_inactive_options(self):
+        messages = checks.check_performance(None)
+        hints = [message.hint for message in messages]
+        self.assertIn('THUMBNAIL_WORKERS=0', hints)
+        self.assertIn('CONN_HEALTH_CHECKS=False', hints)
+        ids = {message.hint: message.id for message in messages}
+        self.assertEqual(ids['THUMBNAIL_WORKERS=0'], 'core.W008')
+        self.assertEqual(ids['CONN_HEALTH_CHECKS=False'], 'core.W006')
+
+    @override_settings(CONN_HEALTH_CHECKS=True)
+    def test_broken_connection_is_closed_before_request(self):
+        Post.objects.exists()
+        with mock.patch.object(
+            connection, 'is_usable', return_value=False
+        ), mock.patch.object(connection, 'close') as close:
+            self.client.get(reverse('about:tech'))
+        close.assert_called()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Настройки SQLite')
+class SQLiteTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def wrapper(self, **options):
+        wrapper = DatabaseWrapper(dict(
+            connection.settings_dict,
+            NAME=os.path.join(self.directory, 'db.sqlite3'),
+            OPTIONS={**connection.settings_dict['OPTIONS'], **options},
+        ), alias='sqlite_test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_are_applied_on_connect(self):
+        values = {}
+        with self.wrapper().cursor() as cursor:
+            for name in ('journal_mode', 'synchronous', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                values[name] = cursor.fetchone()[0]
+        self.assertEqual(
+            values, {'journal_mode': 'wal', 'synchronous': 1, 'temp_store': 2}
+        )
+
+    def test_begin_is_retried_while_database_is_locked(self):
+        holder = self.wrapper()
+        holder.cursor().execute('BEGIN IMMEDIATE')
+        writer = self.wrapper(timeout=0.01, retries=2)
+        with mock.patch(
+            'core.backends.sqlite3.base.RETRY_BACKOFF', 0.001
+        ), CaptureQueriesContext(writer) as captured:
+            with self.assertRaisesMessage(
+                OperationalError, 'database is locked'
+            ):
+                writer._start_transaction_under_autocommit()
+        self.assertEqual(
+            [query['sql'] for query in captured], ['BEGIN IMMEDIATE'] * 3
+        )
+        holder.cursor().execute('ROLLBACK')
+        writer._start_transaction_under_autocommit()
+        writer.cursor().execute('ROLLBACK')
+
+    def test_concurrency_benchmark_reports_both_modes(self):
+        out = StringIO()
+        call_command(
+            'sqlite_concurrency', readers=1, writers=1, duration=0.2,
+            database=os.path.join(self.directory, 'bench.sqlite3'),
+            stdout=out
+        )
+        lines = out.getvalue().splitlines()
+        for mode in ('default', 'tuned'):
+            for role in ('reader', 'writer'):
+                self.assertTrue(any(
+                    line.startswith(f'{mode:8} {role:7}') for line in lines
+                ), out.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Пул соединений PostgreSQL')
+class ConnectionPoolTest(TestCase):
+    def setUp(self):
+        from core.backends.postgresql.pool import Pool
+
+        self.pool = Pool(
+            connection.get_connection_params(),
+            min_size=1, max_size=1, timeout=0.01
+        )
+        self.addCleanup(self.pool.close)
+
+    def test_exhausted_pool_waits_then_fails(self):
+        from psycopg2 import OperationalError
+
+        first = self.pool.get()
+        with self.assertRaisesMessage(OperationalError, 'исчерпан'):
+            self.pool.get()
+        self.pool.put(first)
+        self.assertIs(self.pool.get(), first)
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+        first = self.pool.get()
+        first.cursor().execute('SELECT 1')
+        self.pool.put(first)
+        second = self.pool.get()
+        self.assertIs(second, first)
+        self.assertEqual(
+            second.get_transaction_status(), TRANSACTION_STATUS_IDLE
+        )
+
+
+@skipUnless('replica' in settings.DATABASES, 'Реплика SQLite')
+# Без общей оболочки: страницы вошедших рисуются на каждый запрос
+# и читают с реплики, а кэш наполняется из основной базы.
+@override_settings(DATABASE_REPLICAS=['replica'], PAGE_CACHE_SHELL='')
+class ReplicaTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Primary')
+        self.post = Post.objects.create(author=self.author, text='Старый')
+        self.reader = User.objects.create_user(username='Replica')
+        self.client.force_login(self.reader)
+        replicas.replicate()
+
+    def test_read_views_use_replica(self):
+        Post.objects.create(author=self.author, text='Не реплицирован')
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Не реплицирован')
+        replicas.replicate()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Не реплицирован')
+
+    def test_writer_is_pinned_to_primary(self):
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Свой комментарий'}
+        )
+        self.assertIn(replicas.PIN_COOKIE, self.client.cookies)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(response, 'Свой комментарий')
+
+    def test_reads_without_pin_cookie_are_stale(self):
+        self.client.post(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        del self.client.cookies[replicas.PIN_COOKIE]
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, 'Старый')
+
+    def test_read_only_request_is_not_pinned(self):
+        self.client.get(reverse('posts:index'))
+        self.assertNotIn(replicas.PIN_COOKIE, self.client.cookies)
+
+    def test_anonymous_page_cache_is_filled_from_primary(self):
+        Post.objects.create(author=self.author, text='Не реплицирован')
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Не реплицирован')
+
+    def test_replicate_command(self):
+        Post.objects.create(author=self.author, text='Не реплицирован')
+        call_command('replicate_sqlite', stdout=StringIO())
+        self.assertTrue(
+            Post.objects.using('replica').filter(
+                text='Не реплицирован'
+            ).exists()
+        )
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_replicate_command_requires_replicas(self):
+        with self.assertRaises(CommandError):
+            call_command('replicate_sqlite', stdout=StringIO())
+
+
+class RevalidateTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='новое'):
+        def compute():
+            self.calls += 1
+            return value
+        return compute
+
+    def get(self, compute=None, soft_timeout=60, is_fresh=None):
+        return revalidate.get_or_compute(
+            'key', compute or self.compute(), soft_timeout, 600,
+            is_fresh=is_fresh, name='test'
+        )
+
+    def test_fresh_value_is_not_recomputed(self):
+        self.assertEqual(self.get(), 'новое')
+        self.assertEqual(self.get(), 'новое')
+        self.assertEqual(self.calls, 1)
+
+    def test_none_is_not_cached(self):
+        self.assertIsNone(self.get(self.compute(None)))
+        self.assertIsNone(self.get(self.compute(None)))
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_value_served_while_locked(self):
+        self.get(self.compute('старое'), soft_timeout=0)
+        cache.add('lock:key', 1)
+        self.assertEqual(self.get(), 'старое')
+        self.assertEqual(self.calls, 1)
+        cache.delete('lock:key')
+        self.assertEqual(self.get(), 'новое')
+        self.assertFalse(cache.get('lock:key'))
+
+    def test_stale_value_not_allowed_is_recomputed(self):
+        self.get(self.compute('старое'), soft_timeout=0)
+        cache.add('lock:key', 1)
+        self.assertEqual(
+            revalidate.get_or_compute(
+                'key', self.compute(), 60, 600, allow_stale=False
+            ),
+            'новое'
+        )
+        self.assertEqual(self.get(), 'новое')
+        self.assertEqual(self.calls, 2)
+
+    def test_rejected_value_is_stale(self):
+        self.get(self.compute('старое'))
+        self.assertEqual(
+            self.get(is_fresh=lambda value: value != 'старое'), 'новое'
+        )
+
+    def test_concurrent_misses_compute_once(self):
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.1)
+            self.calls += 1
+            return 'новое'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.get(slow)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['новое'] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_miss_waits_for_lock_holder(self):
+        cache.add('lock:key', 1)
+        # Другой воркер заканчивает пересчёт чуть позже.
+        timer = threading.Timer(
+            0.05, cache.set, ('key', (time.time() + 60, 'чужое'))
+        )
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(self.get(), 'чужое')
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(CACHE_LOCK_WAIT=0.05)
+    def test_lock_wait_times_out(self):
+        cache.add('lock:key', 1)
+        self.assertEqual(self.get(), 'новое')
+        self.assertEqual(self.calls, 1)
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_dataset', stdout=StringIO(), **{
+            'users': 20, 'groups': 3, 'posts': 60, 'comments': 120,
+        })
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.history = os.path.join(directory, 'history.json')
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark', current_db='test', requests=3,
+            history=self.history, stdout=StringIO(), **{
+                # Задержки в тестах шумные: регрессия — только по запросам.
+                'min_delta': 10 ** 6, **options
+            }
+        )
+        with open(self.history, encoding='utf-8') as file:
+            return json.load(file)
+
+    def test_every_route_is_measured(self):
+        follows = Follow.objects.count()
+        results = self.benchmark()[-1]['results']
+        self.assertEqual(Follow.objects.count(), follows)
+        self.assertIn('posts:index', results)
+        self.assertIn('users:signup', results)
+        self.assertIn('about:tech', results)
+        self.assertIn('posts:profile_unfollow', results)
+        detail = results['posts:post_detail']
+        self.assertEqual(set(detail), {'anonymous', 'user'})
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries',
+                    'rss_delta_kb'):
+            self.assertIn(key, detail['user'])
+        self.assertEqual(detail['user']['status'], HTTPStatus.OK)
+        self.assertEqual(
+            results['posts:follow_index']['anonymous']['status'],
+            HTTPStatus.FOUND
+        )
+
+    def test_cache_modes_have_separate_baselines(self):
+        self.benchmark()
+        with open(self.history, encoding='utf-8') as file:
+            history = json.load(file)
+        history[0]['results']['posts:index']['user']['queries'] = 0
+        with open(self.history, 'w', encoding='utf-8') as file:
+            json.dump(history, file)
+        history = self.benchmark(warm_cache=True)
+        self.assertEqual(history[-1]['cache'], 'warm')
+        self.assertFalse(history[-1]['regressions'])
+
+    def test_regression_fails_and_is_recorded(self):
+        self.benchmark()
+        self.benchmark()
+        with open(self.history, encoding='utf-8') as file:
+            history = json.load(file)
+        for run in history:
+            run['results']['posts:index']['user']['queries'] = 0
+        with open(self.history, 'w', encoding='utf-8') as file:
+            json.dump(history, file)
+        with self.assertRaisesMessage(
+            CommandError, 'posts:index user: запросов 0'
+        ):
+            self.benchmark()
+        with open(self.history, encoding='utf-8') as file:
+            history = json.load(file)
+        self.assertEqual(len(history), 3)
+        self.assertTrue(history[-1]['regressions'])
+        self.assertTrue(Post.objects.exists())
+
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+FAKE_SERVERS = {}
+
+
+def fake_redis(location):
+    """Клиенты одного LOCATION-хоста делят один fakeredis-сервер."""
+    host = location.split('/')[2].split('-')[0]
+    server = FAKE_SERVERS.setdefault(host, fakeredis.FakeServer())
+    return fakeredis.FakeRedis(server=server)
+
+
+@skipIf(fakeredis is None, 'fakeredis не установлен')
+class NearCacheTest(TestCase):
+    def make_cache(self, location, **options):
+        options.setdefault(
+            'CLIENT_FACTORY', 'core.tests.fake_redis'
+        )
+        options.setdefault('INVALIDATION_CHANNEL', f'{self.id()}:channel')
+        return NearCache(location, {'OPTIONS': options})
+
+    def setUp(self):
+        FAKE_SERVERS.clear()
+        self.worker_1 = self.make_cache(f'fake://{self.id()}-1')
+        self.worker_2 = self.make_cache(f'fake://{self.id()}-2')
+
+    def wait_for(self, predicate):
+        deadline = time.monotonic() + 2
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail('Не дождались инвалидации ближнего кэша')
+            time.sleep(0.01)
+
+    def test_cache_api(self):
+        cache = self.worker_1
+        cache.set('post', {'text': 'Пост'})
+        self.assertEqual(cache.get('post'), {'text': 'Пост'})
+        self.assertFalse(cache.add('post', 'другой'))
+        self.assertTrue(cache.add('version', 1))
+        self.assertEqual(cache.incr('version'), 2)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        self.assertEqual(
+            cache.get_many(['post', 'version', 'missing']),
+            {'post': {'text': 'Пост'}, 'version': 2}
+        )
+        cache.delete('post')
+        self.assertIsNone(cache.get('post'))
+        cache.set('short', 'значение', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.worker_2.get('short'))
+
+    def test_near_cache_serves_repeated_reads(self):
+        self.worker_1.set('page', 'v1')
+        self.assertEqual(self.worker_1.get('page'), 'v1')
+        # Запись мимо бэкенда: ближний кэш о ней не знает.
+        self.worker_1.client.set(self.worker_1.make_key('page'), dumps('v2'))
+        self.assertEqual(self.worker_1.get('page'), 'v1')
+        self.assertEqual(self.worker_2.get('page'), 'v2')
+
+    def test_writes_invalidate_other_processes(self):
+        self.worker_1.set('page', 'v1')
+        self.assertEqual(self.worker_2.get('page'), 'v1')
+        self.worker_1.set('page', 'v2')
+        self.wait_for(lambda: self.worker_2.get('page') == 'v2')
+        self.worker_1.clear()
+        self.wait_for(lambda: self.worker_2.get('page') is None)
+
+    def test_value_read_before_write_is_not_kept(self):
+        cache = self.worker_1
+        cache.set('page', 'v1')
+        key = cache.make_key('page')
+        pipeline = cache.client.pipeline()
+        execute = pipeline.execute
+
+        def read_then_write():
+            # Другой поток пишет сразу после того, как этот прочитал.
+            result = execute()
+            cache.set('page', 'v2')
+            return result
+
+        pipeline.execute = read_then_write
+        with mock.patch.object(
+            cache.client, 'pipeline', return_value=pipeline
+        ):
+            self.assertEqual(cache._fetch(key), dumps('v1'))
+        self.assertEqual(cache.get('page'), 'v2')
+
+    def test_versions_bypass_near_cache(self):
+        self.worker_1.add('version:posts', 1)
+        self.assertEqual(self.worker_1.get('version:posts'), 1)
+        self.worker_1.client.set(self.worker_1.make_key('version:posts'), 2)
+        self.assertEqual(self.worker_1.get('version:posts'), 2)
+        self.assertEqual(
+            self.worker_1.get_many(['version:posts']), {'version:posts': 2}
+        )
+        self.assertEqual(len(self.worker_1.local), 0)
+
+    def test_local_tier_is_bounded(self):
+        cache = self.make_cache(
+            f'fake://{self.id()}-3', L1_MAX_ENTRIES=3, L1_TIMEOUT=60
+        )
+        for i in range(10):
+            cache.set(f'key{i}', i)
+            cache.get(f'key{i}')
+        self.assertEqual(len(cache.local), 3)
+        self.assertEqual(cache.get('key0'), 0)
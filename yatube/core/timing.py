@@ -0,0 +1,204 @@
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timings', default=None)
+_MISSING = object()
+
+
+class Timings:
+    """ Счётчики одного запроса: БД, кэш и шаблоны. """
+    __slots__ = (
+        'db', 'queries', 'cache', 'hits', 'misses', 'template',
+        'in_cache', 'in_template', 'view',
+    )
+
+    def __init__(self):
+        self.db = self.cache = self.template = 0.0
+        self.queries = self.hits = self.misses = 0
+        self.in_cache = self.in_template = False
+        self.view = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def header(self, total):
+        return ', '.join((
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'cache;dur={self.cache * 1000:.1f};'
+            f'desc="{self.hits} hits {self.misses} misses"',
+            f'template;dur={self.template * 1000:.1f}',
+        ))
+
+
+def current_view():
+    """ Имя view обрабатываемого запроса или None. """
+    timings = _current.get()
+    return timings and timings.view
+
+
+def _timed_get(get):
+    @wraps(get)
+    def wrapper(key, default=None, version=None):
+        timings = _current.get()
+        # Вложенные вызовы (get_many через get) уже учтены внешним.
+        if timings is None or timings.in_cache:
+            return get(key, default, version)
+        timings.in_cache = True
+        started = time.perf_counter()
+        try:
+            value = get(key, _MISSING, version)
+        finally:
+            timings.cache += time.perf_counter() - started
+            timings.in_cache = False
+        if value is _MISSING:
+            timings.misses += 1
+            return default
+        timings.hits += 1
+        return value
+    wrapper.timed = True
+    return wrapper
+
+
+def _timed_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(keys, version=None):
+        timings = _current.get()
+        if timings is None or timings.in_cache:
+            return get_many(keys, version)
+        keys = list(keys)
+        timings.in_cache = True
+        started = time.perf_counter()
+        try:
+            found = get_many(keys, version)
+        finally:
+            timings.cache += time.perf_counter() - started
+            timings.in_cache = False
+        timings.hits += len(found)
+        timings.misses += len(keys) - len(found)
+        return found
+    wrapper.timed = True
+    return wrapper
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None or timings.in_template:
+            return render(self, context, request)
+        timings.in_template = True
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            timings.template += time.perf_counter() - started
+            timings.in_template = False
+    wrapper.timed = True
+    return wrapper
+
+
+def time_caches():
+    """
+    Оборачивает чтение из кэшей текущего потока. Django создаёт
+    экземпляры кэшей на поток: обёртки ставятся на них, а классы
+    бэкендов остаются нетронутыми.
+    """
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if not getattr(backend.get, 'timed', False):
+            backend.get = _timed_get(backend.get)
+            backend.get_many = _timed_get_many(backend.get_many)
+
+
+def install():
+    """
+    Оборачивает отрисовку шаблонов. Вне запроса обёртка сразу
+    вызывает исходный метод.
+    """
+    if not getattr(Template.render, 'timed', False):
+        Template.render = _timed_render(Template.render)
+
+
+class RequestTimingMiddleware:
+    """
+    Время запроса, запросы к БД, попадания в кэш и отрисовка шаблонов:
+    строкой журнала с именем view, в метриках Prometheus и в заголовке
+    Server-Timing — его получают те, кому разрешает SERVER_TIMING.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        time_caches()
+        timings = Timings()
+        token = _current.set(timings)
+        metrics.IN_FLIGHT.add()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(
+                            timings.record_query
+                        )
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            metrics.IN_FLIGHT.add(amount=-1)
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else '-'
+        self.observe(request, response, view, total, timings)
+        if self.show_timing(request):
+            response['Server-Timing'] = timings.header(total)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                'view=%s method=%s status=%s total_ms=%.1f db_ms=%.1f '
+                'queries=%d cache_hits=%d cache_misses=%d template_ms=%.1f',
+                view, request.method,
+                response.status_code, total * 1000, timings.db * 1000,
+                timings.queries, timings.hits, timings.misses,
+                timings.template * 1000,
+            )
+        return response
+
+    def show_timing(self, request):
+        # Времена БД и кэша посторонним не показываются.
+        if settings.SERVER_TIMING == 'staff':
+            user = getattr(request, 'user', None)
+            return user is not None and user.is_staff
+        return bool(settings.SERVER_TIMING)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.view = request.resolver_match.view_name
+
+    def observe(self, request, response, view, total, timings):
+        metrics.REQUESTS.inc(view, request.method, response.status_code)
+        metrics.LATENCY.observe(total, view)
+        metrics.QUERIES.observe(timings.queries, view)
+        if timings.hits:
+            metrics.CACHE.inc(view, 'hit', amount=timings.hits)
+        if timings.misses:
+            metrics.CACHE.inc(view, 'miss', amount=timings.misses)
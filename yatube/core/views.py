@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+
+from . import metrics, personal
 
 
 def page_not_found(request, exception):
@@ -15,3 +20,25 @@ def server_error(request):
 
 def permission_denied_view(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics_export(request):
+    """ Метрики всех процессов в текстовом формате Prometheus. """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        metrics.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def fragment(request, name):
+    """
+    Фрагмент страницы для текущего пользователя: его запрашивает
+    кэширующий прокси по метке ESI из общей оболочки страницы.
+    """
+    if not personal.exists(name):
+        raise Http404
+    response = HttpResponse(personal.render(request, name, request.GET))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
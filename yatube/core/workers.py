@@ -0,0 +1,14 @@
+import django
+
+
+def setup(overrides):
+    """
+    Инициализатор процесса пула, запущенного через spawn: поднимает
+    Django по унаследованному DJANGO_SETTINGS_MODULE и переносит
+    настройки родителя из overrides. Модуль не импортирует моделей —
+    его распаковывают до django.setup().
+    """
+    django.setup()
+    from django.conf import settings
+    for name, value in overrides.items():
+        setattr(settings, name, value)
@@ -0,0 +1,21 @@
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+os.environ.setdefault('DJANGO_ENV', 'prod')
+
+wsgi_app = 'yatube.wsgi:application'
+
+
+def on_starting(server):
+    """ Метрики прошлого запуска не должны попасть в новые. """
+    from core import metrics
+    metrics.clear()
+
+
+def when_ready(server):
+    """ Отчёт о том, какие опции производительности включены. """
+    import django
+    django.setup()
+    from core.checks import report
+    for line in report():
+        server.log.info(line)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Group, Post
+from .search import get_backend
 
 
 @admin.register(Post)
@@ -11,5 +12,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE по всей таблице.
+        if not search_term:
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
+
 
 admin.site.register(Group)
@@ -0,0 +1,103 @@
+from itertools import islice
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+BATCH_SIZE = 500
+
+
+def _count(model, field, outer):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def _reconcile(queryset, counters, outer):
+    """
+    Обновляет строки, где счётчик разошёлся с реальным числом.
+    Расхождения читаются порциями: на PostgreSQL iterator() идёт
+    серверным курсором, и весь список в память не грузится.
+    """
+    actual = {
+        name: _count(model, field, outer)
+        for name, (model, field) in counters.items()
+    }
+    drifted = queryset.annotate(**{
+        f'actual_{name}': expression
+        for name, expression in actual.items()
+    }).exclude(**{
+        name: F(f'actual_{name}') for name in counters
+    }).values_list('pk', flat=True).iterator(chunk_size=BATCH_SIZE)
+    total = 0
+    while True:
+        batch = list(islice(drifted, BATCH_SIZE))
+        if not batch:
+            return total
+        queryset.model.objects.filter(pk__in=batch).update(**actual)
+        total += len(batch)
+
+
+def recount_users(users=None):
+    """ Сверяет счётчики пользователей, возвращает число исправленных. """
+    users = User.objects.all() if users is None else users
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id)
+            for user_id in users.filter(stats__isnull=True).values_list(
+                'pk', flat=True
+            )
+        ),
+        ignore_conflicts=True,
+    )
+    return _reconcile(
+        UserStats.objects.filter(user__in=users), USER_COUNTERS, 'user_id'
+    )
+
+
+def recount_posts(posts=None):
+    """ Сверяет счётчики комментариев, возвращает число исправленных. """
+    posts = Post.objects.all() if posts is None else posts
+    return _reconcile(
+        posts, {'comments_count': (Comment, 'post_id')}, 'pk'
+    )
+
+
+def get_stats(user):
+    """ Счётчики пользователя; недостающая строка создаётся пересчётом. """
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        recount_users(User.objects.filter(pk=user.pk))
+        return UserStats.objects.get(user=user)
+
+
+def _bumped(field, delta):
+    # Разошедшийся счётчик не уходит ниже нуля: иначе CHECK (>= 0)
+    # сорвёт отписку или удаление. Поправит его reconcile_counters.
+    return Greatest(F(field) + delta, 0)
+
+
+def bump_user(user_id, field, delta):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{field: _bumped(field, delta)}
+    )
+    if not updated and delta > 0:
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_bumped('comments_count', delta)
+    )
@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import FeedEntry, Follow, Post, PulledAuthor, UserStats
+from .paginator import NEXT, CursorPaginator, keyset
+
+
+def is_pulled(author_id):
+    return PulledAuthor.objects.filter(author_id=author_id).exists()
+
+
+def _push(posts, user_ids):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for post in posts
+            for user_id in user_ids
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _followers_count(author_id):
+    return UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def _is_prolific(author_id):
+    return _followers_count(author_id) >= settings.FEED_FANOUT_FOLLOWERS_LIMIT
+
+
+def fan_out_post(post):
+    """ Раскладывает новый пост по лентам подписчиков автора. """
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _push((post,), list(followers))
+
+
+def backfill(user_ids, author_id):
+    """ Добавляет в ленты последние посты автора. """
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).only('pk', 'author_id', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+    _push(list(posts), user_ids)
+
+
+@transaction.atomic
+def follow_added(follow):
+    if _is_prolific(follow.author_id):
+        PulledAuthor.objects.get_or_create(author_id=follow.author_id)
+    elif not is_pulled(follow.author_id):
+        backfill((follow.user_id,), follow.author_id)
+
+
+@transaction.atomic
+def follow_removed(follow):
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id
+    ).delete()
+    if _is_prolific(follow.author_id):
+        return
+    deleted, _ = PulledAuthor.objects.filter(
+        author_id=follow.author_id
+    ).delete()
+    if deleted:
+        # Автор снова раздаётся на запись: его посты, которые читались
+        # при запросе, нужно дозаписать в ленты оставшихся подписчиков.
+        followers = Follow.objects.filter(
+            author_id=follow.author_id
+        ).values_list('user_id', flat=True)
+        backfill(list(followers), follow.author_id)
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Лента подписок: диапазонное чтение из FeedEntry, слитое
+    с постами авторов, которые не раздаются на запись.
+    """
+    ordering = ('-pub_date', '-post_id')
+
+    def __init__(self, user, per_page, **kwargs):
+        super().__init__(
+            FeedEntry.objects.filter(user=user), per_page, **kwargs
+        )
+        self.user = user
+
+    def fetch(self, direction, pub_date, pk, limit):
+        keys = list(
+            keyset(
+                self.object_list, direction, pub_date, pk, pk_field='post_id'
+            ).values_list('pub_date', 'post_id')[:limit]
+        )
+        pulled = Follow.objects.filter(
+            user=self.user,
+            author__in=PulledAuthor.objects.values('author_id')
+        ).values('author_id')
+        if pulled.exists():
+            posts = Post.objects.filter(
+                author__in=pulled
+            ).order_by('-pub_date', '-pk')
+            keys += keyset(
+                posts, direction, pub_date, pk
+            ).values_list('pub_date', 'pk')[:limit]
+            keys = sorted(set(keys), reverse=direction == NEXT)[:limit]
+        ids = [post_id for _, post_id in keys]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def fill(first_user_id, last_user_id):
+    """
+    Заполняет ленты читателей из диапазона id одним INSERT ... SELECT
+    по их подпискам: для массовой загрузки данных в обход сигналов.
+    """
+    follows = Follow._meta.db_table
+    posts = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT {follows}.user_id, recent.id, recent.author_id, '
+            f'recent.pub_date FROM {follows} JOIN ('
+            f'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {posts}'
+            f') recent ON recent.author_id = {follows}.author_id '
+            f'WHERE {follows}.user_id BETWEEN %s AND %s '
+            f'AND recent.position <= %s '
+            f'AND {follows}.author_id NOT IN '
+            f'(SELECT author_id FROM {PulledAuthor._meta.db_table}) '
+            f'ORDER BY {follows}.user_id, recent.pub_date',
+            (first_user_id, last_user_id, settings.FEED_BACKFILL_LIMIT)
+        )
+        return cursor.rowcount
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import page_cache
+
+
+def _variant(context):
+    """ Часть ключа от контекста карточки: страница группы, автора. """
+    return ','.join(
+        f'{name}={getattr(value, "pk", value) or ""}'
+        for name, value in sorted(context.items())
+    )
+
+
+def card_scopes(post):
+    """
+    Области страничного кэша, от которых зависит карточка: сам пост,
+    имя автора и название группы. Новые посты автора или группы
+    последние две не меняют.
+    """
+    scopes = [f'post:{post.pk}', f'user:{post.author_id}']
+    if post.group_id:
+        scopes.append(f'group-info:{post.group_id}')
+    return scopes
+
+
+def render_cards(posts, template_name, request=None, **context):
+    """
+    Отрисованные карточки постов. Ключ карточки содержит версии её
+    областей (card_scopes), поэтому правка, комментарий, смена группы
+    или переименование автора и группы просто делают старую запись
+    недостижимой. Те же области получает
+    кэшируемая страница request. Все карточки страницы берутся одним
+    get_many, отрисовываются только промахи.
+    """
+    posts = list(posts)
+    scopes = [card_scopes(post) for post in posts]
+    known = page_cache.versions(
+        scope for post_scopes in scopes for scope in post_scopes
+    )
+    if request is not None:
+        page_cache.depends_on(request, *{
+            scope for post_scopes in scopes for scope in post_scopes[1:]
+        })
+    variant = _variant(context)
+    keys = [
+        f'card:{template_name}:{variant}:{post.pk}:' + ':'.join(
+            str(known[scope]) for scope in post_scopes
+        )
+        for post, post_scopes in zip(posts, scopes)
+    ]
+    found = cache.get_many(keys)
+    missing = {}
+    template = None
+    cards = []
+    for post, key in zip(posts, keys):
+        card = found.get(key)
+        if card is None:
+            template = template or get_template(template_name)
+            card = missing[key] = template.render(dict(context, post=post))
+        cards.append(mark_safe(card))
+    if missing:
+        cache.set_many(missing, settings.CARD_CACHE_TIMEOUT)
+    return cards
@@ -0,0 +1,355 @@
+import random
+import time
+from array import array
+from bisect import bisect
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, reset_queries, transaction
+from django.db.models import DateTimeField, Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts import feeds, page_cache
+from posts.models import (Comment, Follow, Group, Post, PulledAuthor, User,
+                          UserStats)
+from posts.search import get_backend
+
+# Показатели степенных распределений: чем больше, тем сильнее перекос.
+AUTHOR_SKEW = 1.1
+GROUP_SKEW = 1.3
+COMMENTER_SKEW = 0.8
+FOLLOW_TAIL = 2.0
+COMMENT_TAIL = 2.0
+TOP_WORD_REPEATS = 10000
+GROUPLESS_SHARE = 0.3
+
+
+def zipf_weights(size, skew):
+    """ Накопленные веса закона Ципфа для bisect. """
+    return list(accumulate(1 / rank ** skew for rank in range(1, size + 1)))
+
+
+def pick(rng, cum_weights):
+    """ Индекс по накопленным весам. """
+    return bisect(cum_weights, rng.random() * cum_weights[-1])
+
+
+def heavy_tail(rng, mean, tail, limit):
+    """ Целое с распределением Парето и заданным средним. """
+    value = (rng.paretovariate(tail) - 1) * mean * (tail - 1)
+    # Случайное округление сохраняет среднее, в отличие от int().
+    return min(int(value + rng.random()), limit)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные заданного масштаба: пользователей '
+        'со степенным графом подписок, группы, посты и комментарии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.0,
+            help='Доля постов с картинкой, от 0 до 1.'
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='password')
+        parser.add_argument(
+            '--skip-feeds', action='store_true',
+            help=(
+                'Не заполнять ленты подписок: на каждую подписку '
+                'пишется до FEED_BACKFILL_LIMIT записей.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.seed = options['seed']
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+        self.words = self.vocabulary()
+        self.first_user = self.next_pk(User)
+        self.user_count = options['users']
+        self.posts_count = array('l', bytes(8 * self.user_count))
+        self.followers_count = array('l', bytes(8 * self.user_count))
+        self.following_count = array('l', bytes(8 * self.user_count))
+        # Пользователи в случайном порядке популярности: самые активные
+        # авторы и самые читаемые — не обязательно первые по id.
+        rng = self.rng('popularity')
+        self.popularity = list(range(self.user_count))
+        rng.shuffle(self.popularity)
+        self.author_weights = zipf_weights(self.user_count, AUTHOR_SKEW)
+        self.step('пользователей', self.create_users)
+        self.step('групп', self.create_groups)
+        self.step('подписок', self.create_follows)
+        self.step('постов', self.create_posts)
+        self.step('комментариев', self.create_comments)
+        self.step('счётчиков', self.create_stats)
+        self.reset_sequences()
+        if not options['skip_feeds']:
+            self.step('записей лент', self.create_feeds)
+        self.step('постов в поиске', get_backend().rebuild)
+        page_cache.bump('posts')
+
+    def rng(self, stream):
+        """ Отдельный генератор на поток данных: потоки независимы. """
+        return random.Random(f'{self.seed}:{stream}')
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def step(self, name, create):
+        started = time.monotonic()
+        total = create()
+        self.stdout.write(
+            f'Создано {name}: {total} за {time.monotonic() - started:.1f} с'
+        )
+
+    def create_objects(self, model, objects):
+        total = 0
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(batch)
+            total += len(batch)
+            # При DEBUG журнал запросов иначе копит весь SQL вставок.
+            reset_queries()
+        return total
+
+    def insert(self, model, fields, rows):
+        """
+        Вставка кортежей значений пачками через executemany: на больших
+        потоках в разы быстрее bulk_create, экземпляры моделей не нужны.
+        """
+        quote = connection.ops.quote_name
+        fields = [model._meta.get_field(name) for name in fields]
+        sql = (
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({", ".join(quote(field.column) for field in fields)}) '
+            f'VALUES ({", ".join(["%s"] * len(fields))})'
+        )
+        # Преобразование для БД нужно только датам: для остальных
+        # полей значения уже готовы, а вызов на каждое поле дорог.
+        dates = [
+            index for index, field in enumerate(fields)
+            if isinstance(field, DateTimeField)
+        ]
+        adapt = connection.ops.adapt_datetimefield_value
+        total = 0
+        for batch in batches(rows, self.batch_size):
+            if dates:
+                batch = [list(row) for row in batch]
+                for row in batch:
+                    for index in dates:
+                        row[index] = adapt(row[index])
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            total += len(batch)
+            reset_queries()
+        return total
+
+    def user_pk(self, index):
+        return self.first_user + index
+
+    def vocabulary(self):
+        """
+        Словарь текстов, где слово ранга r повторено ~1/r раз:
+        равномерный выбор из него даёт частоты по закону Ципфа.
+        """
+        faker = Faker('ru_RU')
+        faker.seed_instance(self.seed)
+        words = set(faker.words(nb=3000))
+        for source in (faker.last_name, faker.city_name, faker.job):
+            words.update(
+                word.lower() for _ in range(3000) for word in source().split()
+            )
+        words = sorted(words)
+        self.rng('vocabulary').shuffle(words)
+        return [
+            word for rank, word in enumerate(words, 1)
+            for _ in range(max(1, round(TOP_WORD_REPEATS / rank)))
+        ]
+
+    def text(self, rng, low, high):
+        words = rng.choices(self.words, k=rng.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+    def create_users(self):
+        password = make_password(self.options['password'])
+        return self.create_objects(User, (
+            User(
+                pk=self.user_pk(index),
+                username=f'user{self.user_pk(index)}',
+                password=password,
+                first_name='Пользователь',
+                last_name=str(self.user_pk(index)),
+                date_joined=self.start,
+            )
+            for index in range(self.user_count)
+        ))
+
+    def create_groups(self):
+        self.first_group = self.next_pk(Group)
+        count = self.options['groups']
+        self.group_weights = zipf_weights(count, GROUP_SKEW)
+        rng = self.rng('groups')
+        return self.create_objects(Group, (
+            Group(
+                pk=self.first_group + index,
+                title=self.text(rng, 1, 3)[:200],
+                slug=f'group-{self.first_group + index}',
+                description=self.text(rng, 5, 30),
+            )
+            for index in range(count)
+        ))
+
+    def follows(self):
+        rng = self.rng('follows')
+        mean = self.options['follows']
+        for index in range(self.user_count):
+            degree = heavy_tail(rng, mean, FOLLOW_TAIL, self.user_count - 1)
+            authors = set()
+            for _ in range(degree * 4):
+                if len(authors) == degree:
+                    break
+                author = self.popularity[pick(rng, self.author_weights)]
+                if author != index:
+                    authors.add(author)
+            for author in sorted(authors):
+                self.followers_count[author] += 1
+                self.following_count[index] += 1
+                yield self.user_pk(index), self.user_pk(author)
+
+    def create_follows(self):
+        return self.insert(Follow, ('user', 'author'), self.follows())
+
+    def create_images(self, rng, count=16):
+        names = []
+        for index in range(count):
+            content = BytesIO()
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (1200, 800), color).save(content, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/synthetic-{self.seed}-{index}.jpg',
+                ContentFile(content.getvalue())
+            ))
+        return names
+
+    def comment_counts(self):
+        """ Число комментариев каждого поста; поток воспроизводим. """
+        rng = self.rng('comment-counts')
+        mean = self.options['comments'] / max(self.options['posts'], 1)
+        for _ in range(self.options['posts']):
+            yield heavy_tail(rng, mean, COMMENT_TAIL, 1000 * int(mean + 1))
+
+    def posts(self):
+        rng = self.rng('posts')
+        count = self.options['posts']
+        images = self.create_images(rng) if self.options['images'] else []
+        span = (self.now - self.start) / max(count, 1)
+        for index, comments in zip(range(count), self.comment_counts()):
+            author = self.popularity[pick(rng, self.author_weights)]
+            self.posts_count[author] += 1
+            group = None
+            if self.group_weights and rng.random() >= GROUPLESS_SHARE:
+                group = self.first_group + pick(rng, self.group_weights)
+            image = ''
+            if images and rng.random() < self.options['images']:
+                image = rng.choice(images)
+            yield (
+                self.first_post + index,
+                self.text(rng, 5, 60),
+                self.start + span * index,
+                self.user_pk(author),
+                group,
+                image,
+                comments,
+                '',
+            )
+
+    def create_posts(self):
+        self.first_post = self.next_pk(Post)
+        return self.insert(Post, (
+            'id', 'text', 'pub_date', 'author', 'group', 'image',
+            'comments_count', 'image_variants',
+        ), self.posts())
+
+    def comments(self):
+        rng = self.rng('comments')
+        weights = zipf_weights(self.user_count, COMMENTER_SKEW)
+        span = (self.now - self.start) / max(self.options['posts'], 1)
+        post_ids = range(
+            self.first_post, self.first_post + self.options['posts']
+        )
+        for post_id, count in zip(post_ids, self.comment_counts()):
+            posted = self.start + span * (post_id - self.first_post)
+            for _ in range(count):
+                yield (
+                    post_id,
+                    self.user_pk(self.popularity[pick(rng, weights)]),
+                    self.text(rng, 2, 25),
+                    posted + timedelta(seconds=rng.randrange(86400)),
+                )
+
+    def create_comments(self):
+        return self.insert(
+            Comment, ('post', 'author', 'text', 'created'), self.comments()
+        )
+
+    def create_stats(self):
+        limit = settings.FEED_FANOUT_FOLLOWERS_LIMIT
+        self.create_objects(PulledAuthor, (
+            PulledAuthor(author_id=self.user_pk(index))
+            for index in range(self.user_count)
+            if self.followers_count[index] >= limit
+        ))
+        return self.create_objects(UserStats, (
+            UserStats(
+                user_id=self.user_pk(index),
+                posts_count=self.posts_count[index],
+                followers_count=self.followers_count[index],
+                following_count=self.following_count[index],
+            )
+            for index in range(self.user_count)
+        ))
+
+    def create_feeds(self):
+        return feeds.fill(self.first_user, self.user_pk(self.user_count - 1))
+
+    def reset_sequences(self):
+        # Ключи заданы явно: последовательности PostgreSQL нужно догнать.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Group, Post, Comment]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Нарезает варианты картинок постов, у которых их нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать варианты и для уже нарезанных картинок.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('image', 'image_variants')
+        queued = 0
+        for post in posts.iterator():
+            if options['all'] or thumbnails.get_manifest(post) is None:
+                thumbnails.enqueue(post)
+                queued += 1
+        thumbnails.wait()
+        self.stdout.write(self.style.SUCCESS(
+            f'Нарезано картинок: {queued}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_posts, recount_users
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики постов, комментариев и подписок с данными.'
+
+    def handle(self, *args, **options):
+        users = recount_users()
+        posts = recount_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: пользователей {users}, постов {posts}'
+        ))
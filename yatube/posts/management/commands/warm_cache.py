@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import warming
+
+SOURCES = ('all', 'stats', 'heuristic')
+
+
+def warm(path):
+    """ В потоке пула: у каждого потока свои соединения с БД. """
+    try:
+        return warming.warm(path)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогрев страничного кэша после выкладки или очистки: самые '
+        'посещаемые страницы из статистики обращений и/или страницы '
+        'по эвристике (главная, крупные группы, популярные авторы).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', choices=SOURCES, default='all',
+            help='Откуда брать страницы: статистика, эвристика или обе.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=100,
+            help='Сколько самых посещаемых страниц взять из статистики.'
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            default=settings.CACHE_WARMING['workers'],
+            help='Потоков отрисовки; 1 — без пула, в текущем потоке.'
+        )
+
+    def handle(self, *args, **options):
+        hits = warming.collect()
+        paths = []
+        if options['source'] in ('all', 'stats'):
+            paths += [path for path, _ in hits.most_common(options['limit'])]
+        if options['source'] in ('all', 'heuristic'):
+            paths += warming.heuristic()
+        paths = list(dict.fromkeys(paths))
+        started = time.monotonic()
+        results = dict(zip(paths, self.run(paths, options['workers'])))
+        elapsed = time.monotonic() - started
+        rendered = sum(result is True for result in results.values())
+        cached = sum(result is False for result in results.values())
+        failed = [
+            path for path, result in results.items()
+            if isinstance(result, Exception)
+        ]
+        for path in failed:
+            self.stderr.write(f'Не прогрета {path}: {results[path]!r}')
+        self.stdout.write(
+            f'Прогрето {rendered + cached} страниц из {len(paths)} за '
+            f'{elapsed:.2f} с: отрисовано {rendered}, уже в кэше '
+            f'{cached}, ошибок {len(failed)}.'
+        )
+        total = sum(hits.values())
+        if total:
+            covered = sum(
+                hits[path] for path, result in results.items()
+                if not isinstance(result, Exception)
+            )
+            self.stdout.write(
+                f'Покрыто {covered / total:.0%} записанных обращений '
+                f'({covered} из {total}).'
+            )
+
+    def run(self, paths, workers):
+        """ Результат по каждой странице; ошибка — вместо результата. """
+        if workers <= 1:
+            return [self.attempt(warming.warm, path) for path in paths]
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(
+                lambda path: self.attempt(warm, path), paths
+            ))
+
+    def attempt(self, function, path):
+        try:
+            return function(path)
+        except Exception as error:
+            return error
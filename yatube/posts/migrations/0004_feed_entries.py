@@ -0,0 +1,103 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+READERS_PER_BATCH = 1000
+
+
+def fill_feeds(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    PulledAuthor = apps.get_model('posts', 'PulledAuthor')
+    # Популярные авторы читаются при запросе, как в generate_dataset:
+    # их посты в ленты не раскладываются.
+    popular = Follow.objects.order_by().values('author_id').annotate(
+        total=models.Count('pk')
+    ).filter(
+        total__gte=settings.FEED_FANOUT_FOLLOWERS_LIMIT
+    ).values_list('author_id', flat=True)
+    PulledAuthor.objects.bulk_create(
+        PulledAuthor(author_id=author_id) for author_id in popular
+    )
+    bounds = Follow.objects.aggregate(
+        first=models.Min('user_id'), last=models.Max('user_id')
+    )
+    if bounds['first'] is None:
+        return
+    follows = Follow._meta.db_table
+    posts = Post._meta.db_table
+    # Ленты заполняются порциями читателей, по одному INSERT ... SELECT.
+    sql = (
+        f'INSERT INTO {FeedEntry._meta.db_table} '
+        f'(user_id, post_id, author_id, pub_date) '
+        f'SELECT {follows}.user_id, recent.id, recent.author_id, '
+        f'recent.pub_date FROM {follows} JOIN ('
+        f'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+        f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+        f') AS position FROM {posts} WHERE author_id IN ('
+        f'SELECT author_id FROM {follows} WHERE user_id BETWEEN %s AND %s'
+        f')) recent ON recent.author_id = {follows}.author_id '
+        f'WHERE {follows}.user_id BETWEEN %s AND %s '
+        f'AND recent.position <= %s '
+        f'AND {follows}.author_id NOT IN '
+        f'(SELECT author_id FROM {PulledAuthor._meta.db_table})'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        for first in range(
+            bounds['first'], bounds['last'] + 1, READERS_PER_BATCH
+        ):
+            last = first + READERS_PER_BATCH - 1
+            cursor.execute(sql, (
+                first, last, first, last, settings.FEED_BACKFILL_LIMIT
+            ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0003_auto_20220619_0728'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PulledAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pulled_feed', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Pulled author',
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Feed entry',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
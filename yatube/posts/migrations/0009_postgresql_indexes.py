@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# Индексы только для PostgreSQL; CONCURRENTLY не блокирует запись
+# в таблицы, но работает лишь вне транзакции.
+INDEXES = (
+    # Полнотекстовый поиск PostgreSQLSearchBackend.
+    (
+        'post_text_search_idx',
+        "posts_post USING gin (to_tsvector('simple', text))",
+    ),
+    # Раздача поста подписчикам читает только user_id по author_id:
+    # покрывающий индекс отвечает без обращения к таблице.
+    (
+        'follow_author_user_idx',
+        'posts_follow (author_id) INCLUDE (user_id)',
+    ),
+)
+# Лента группы никогда не читает посты без группы: частичный индекс
+# меньше и дешевле в обновлении. Имя прежнее — для RemoveIndex.
+GROUP_INDEX = 'post_group_pub_date_idx'
+GROUP_COLUMNS = 'posts_post (group_id, pub_date DESC, id DESC)'
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, definition in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}'
+        )
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY {GROUP_INDEX}')
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY {GROUP_INDEX} ON {GROUP_COLUMNS} '
+        f'WHERE group_id IS NOT NULL'
+    )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY {GROUP_INDEX}')
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY {GROUP_INDEX} ON {GROUP_COLUMNS}'
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -42,6 +42,32 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON с размерами и форматами, готовыми для srcset'
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -67,6 +93,11 @@ class Comment(models.Model):
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Comments'
+        indexes = (
+            models.Index(
+                fields=('post', '-created'), name='comment_post_created_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -88,8 +119,90 @@ class Follow(models.Model):
 
     class Meta:
         verbose_name = 'Follow'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_user_author'
+            ),
+        )
 
     def __str__(self):
         return (f'Пользователь {self.user} '
                 f'подписан на пользователя {self.author}'
                 )
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Feed entry'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'), name='feed_user_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class PulledAuthor(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='pulled_feed',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Pulled author'
+
+    def __str__(self):
+        return f'Посты {self.author} читаются при запросе ленты'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'User stats'
+
+    def __str__(self):
+        return f'Счётчики пользователя {self.user}'
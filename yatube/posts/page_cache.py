@@ -0,0 +1,307 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, QueryDict
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from core import personal, replicas, revalidate
+
+from . import warming
+
+ANONYMOUS = 'anon'
+SHELL = 'shell'
+
+
+def _digest(text):
+    # Слаги, имена и запросы поиска — не всегда допустимые ключи
+    # memcached: в ключ идёт их хэш.
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def _version_key(scope):
+    return f'version:{_digest(scope)}'
+
+
+def _modified_key(scope):
+    return f'modified:{_digest(scope)}'
+
+
+def _scopes_key(view_name, path):
+    return f'scopes:{view_name}:{_digest(path)}'
+
+
+def _page_key(view_name, audience, path):
+    return f'page:{view_name}:{audience}:{_digest(path)}'
+
+
+def _normalize(request, params):
+    """
+    Оставляет в request.GET только параметры params, от которых
+    зависит страница, и возвращает путь с ними в постоянном порядке:
+    посторонние параметры не плодят копий страницы в кэше.
+    """
+    query = QueryDict(mutable=True)
+    for name in sorted(params):
+        if request.GET.get(name):
+            query[name] = request.GET[name]
+    query._mutable = False
+    request.GET = query
+    encoded = query.urlencode()
+    return f'{request.path}?{encoded}' if encoded else request.path
+
+
+def _new_version():
+    # Версия от времени: после вытеснения ключа версии из кэша
+    # она не совпадёт ни с одной из записанных в страницы.
+    return time.time_ns()
+
+
+def stamps(scopes):
+    """
+    Текущие версии областей и время последнего изменения любой из них
+    (None, если оно неизвестно) — одним запросом к кэшу. Недостающие
+    версии создаются.
+    """
+    scopes = set(scopes)
+    found = cache.get_many(
+        [_version_key(scope) for scope in scopes]
+        + [_modified_key(scope) for scope in scopes]
+    )
+    current = {}
+    for scope in scopes:
+        key = _version_key(scope)
+        if key not in found:
+            cache.add(key, _new_version(), None)
+            cache.add(_modified_key(scope), time.time(), None)
+            found[key] = cache.get(key)
+        current[scope] = found[key]
+    modified = [found.get(_modified_key(scope)) for scope in scopes]
+    if None in modified or not modified:
+        return current, None
+    # Дата в HTTP — с точностью до секунды.
+    return current, int(max(modified))
+
+
+def versions(scopes):
+    """ Текущие версии областей, недостающие создаются. """
+    return stamps(scopes)[0]
+
+
+def bump(*scopes):
+    """ Инвалидирует страницы, зависящие от областей. """
+    scopes = set(scopes)
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.set(_version_key(scope), _new_version(), None)
+    now = time.time()
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def depends_on(request, *scopes):
+    """ Добавляет области, от которых зависит отрисовываемая страница. """
+    if hasattr(request, 'page_cache_scopes'):
+        request.page_cache_scopes.extend(scopes)
+
+
+def user_class(request):
+    """ Чья копия страницы в кэше: None — страница не кэшируется. """
+    if settings.PAGE_CACHE_SHELL:
+        return SHELL
+    if request.user.is_authenticated:
+        return None
+    return ANONYMOUS
+
+
+def personalized(request):
+    """
+    Отличается ли ответ от ответов другим пользователям. В режиме esi
+    отдаётся только общая оболочка: её части дорисует прокси.
+    """
+    return (
+        request.user.is_authenticated and settings.PAGE_CACHE_SHELL != 'esi'
+    )
+
+
+def etag(request, view_name, path, scope_versions):
+    """
+    ETag страницы: версии её областей и всё, что в разметке зависит от
+    пользователя, — он сам и CSRF-токен формы комментария.
+    """
+    if personalized(request):
+        viewer = (
+            request.user.pk, request.user.get_username(),
+            # Токен, который уйдёт в cookie, а не пришедший с запросом.
+            request.META.get('CSRF_COOKIE', '')
+        )
+    else:
+        viewer = ANONYMOUS
+    raw = repr((
+        settings.RELEASE, view_name, path, viewer,
+        sorted(scope_versions.items())
+    ))
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _fresh(scope_versions, known):
+    """ Совпадают ли версии записи с текущими; known уже прочитаны. """
+    missing = [scope for scope in scope_versions if scope not in known]
+    if missing:
+        known = dict(known, **versions(missing))
+    return all(known[scope] == version
+               for scope, version in scope_versions.items())
+
+
+def _validators(request, response, tag, modified):
+    response['ETag'] = tag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    # Браузер и CDN хранят страницу, но каждый раз сверяют валидаторы;
+    # страницы вошедшего пользователя CDN не хранит вовсе.
+    patch_cache_control(
+        response, no_cache=True, private=personalized(request)
+    )
+    return response
+
+
+class _Page:
+    """ Одна отрисовка кэшируемой страницы и области, которые она узнала. """
+
+    def __init__(self, request, view_name, path, scopes, view):
+        self.request = request
+        self.view_name = view_name
+        self.path = path
+        self.scopes = scopes
+        self.view = view
+        # Области, добавленные view при прошлой отрисовке.
+        self.stored = cache.get(_scopes_key(view_name, path))
+        self.known, self.modified = stamps(scopes + (self.stored or []))
+        if personalized(request):
+            # Last-Modified не различает пользователей.
+            self.modified = None
+        self.rendered = None
+
+    def etag(self, scope_versions):
+        return etag(self.request, self.view_name, self.path, scope_versions)
+
+    def validators(self, response, scope_versions):
+        return _validators(
+            self.request, response, self.etag(scope_versions), self.modified
+        )
+
+    def not_modified(self):
+        """ Ответ 304, если копия клиента совпадает с текущей страницей. """
+        response = get_conditional_response(
+            self.request, etag=self.etag(self.known),
+            last_modified=self.modified
+        )
+        if response is not None:
+            return self.validators(response, self.known)
+        return None
+
+    def learn(self):
+        added = sorted(
+            set(self.request.page_cache_scopes) - set(self.scopes)
+        )
+        if added != self.stored:
+            cache.set(
+                _scopes_key(self.view_name, self.path), added,
+                settings.PAGE_CACHE_TIMEOUT
+            )
+        return dict(self.known, **versions(
+            scope for scope in added if scope not in self.known
+        ))
+
+    def uncached(self):
+        """ Страница пользователя, которую кэш не хранит. """
+        self.request.page_cache_scopes = list(self.scopes)
+        response = self.view()
+        if response.status_code != 200:
+            return response
+        return self.validators(response, self.learn())
+
+    def render(self, audience):
+        self.request.page_cache_scopes = list(self.scopes)
+        # В общей оболочке вместо частей пользователя — метки.
+        self.request.page_shell = audience == SHELL
+        # Отстающая реплика записала бы под новой версией старую
+        # страницу: кэш наполняется из основной базы.
+        with replicas.primary():
+            self.rendered = self.view()
+        if self.rendered.status_code != 200 or self.rendered.streaming:
+            return None
+        return (self.learn(), self.rendered.content,
+                self.rendered['Content-Type'])
+
+    def lookup(self, audience):
+        """ Запись кэша: свежая, устаревшая или только что отрисованная. """
+        return revalidate.get_or_compute(
+            key=_page_key(self.view_name, audience, self.path),
+            compute=lambda: self.render(audience),
+            soft_timeout=settings.PAGE_CACHE_SOFT_TIMEOUT,
+            timeout=settings.PAGE_CACHE_TIMEOUT,
+            is_fresh=lambda entry: _fresh(entry[0], self.known),
+            name=self.view_name,
+            # Кто только что писал, должен увидеть свою запись: старая
+            # копия ему не годится, как и реплика.
+            allow_stale=replicas.PIN_COOKIE not in self.request.COOKIES
+        )
+
+    def respond(self, audience, entry):
+        """ Ответ из записи кэша с дорисованными частями пользователя. """
+        response = self.rendered
+        if response is None:
+            response = HttpResponse(entry[1], content_type=entry[2])
+        if settings.PAGE_CACHE_SHELL == 'esi':
+            response['Surrogate-Control'] = 'content="ESI/1.0"'
+        elif audience == SHELL:
+            response.content = personal.fill(entry[1], self.request)
+        if not _fresh(entry[0], self.known):
+            # Отдана устаревшая копия: время изменения ей не подходит.
+            self.modified = None
+        return self.validators(response, entry[0])
+
+
+def cache_page_by_scopes(view_name, get_scopes, params=('cursor',)):
+    """
+    Кэширует страницу целиком для анонимных пользователей; params —
+    параметры запроса, которые страница читает.
+    Запись хранит версии областей, от которых зависит страница,
+    и считается устаревшей, как только любая из них изменится.
+    Устаревшую страницу пересчитывает один воркер, остальные пока
+    отдают её старую копию (revalidate.get_or_compute).
+    По тем же версиям страница получает ETag и Last-Modified
+    и отвечает 304 без отрисовки — и анонимам, и вошедшим.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            audience = user_class(request)
+            path = _normalize(request, params)
+            if audience and not getattr(request, 'cache_warming', False):
+                warming.record(path)
+            page = _Page(
+                request, view_name, path, list(get_scopes(**kwargs)),
+                lambda: view_func(request, *args, **kwargs)
+            )
+            response = page.not_modified()
+            if response is not None:
+                return response
+            if audience is None:
+                return page.uncached()
+            entry = page.lookup(audience)
+            if entry is not None:
+                return page.respond(audience, entry)
+            if page.rendered is None:
+                # Страница не кэшируется, а считал её другой поток.
+                return page.view()
+            return page.rendered
+        return wrapper
+    return decorator
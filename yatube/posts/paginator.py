@@ -0,0 +1,141 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def pack_cursor(direction, position=''):
+    """ Упаковывает направление и позицию в непрозрачную строку. """
+    raw = f'{direction}|{position}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def unpack_cursor(cursor):
+    """ Возвращает (направление, позиция или None) или бросает InvalidPage. """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise InvalidPage('Некорректный курсор')
+    direction, _, position = raw.partition('|')
+    if direction not in (NEXT, PREVIOUS):
+        raise InvalidPage('Некорректный курсор')
+    if not position:
+        if direction == NEXT:
+            raise InvalidPage('Некорректный курсор')
+        return direction, None
+    return direction, position
+
+
+def encode_cursor(direction, pub_date=None, pk=None):
+    """ Упаковывает позицию в ленте в непрозрачную строку. """
+    if pub_date is None:
+        return pack_cursor(direction)
+    return pack_cursor(direction, f'{pub_date.isoformat()}|{pk}')
+
+
+def decode_cursor(cursor):
+    """ Возвращает (направление, pub_date, pk) или бросает InvalidPage. """
+    direction, position = unpack_cursor(cursor)
+    if position is None:
+        return direction, None, None
+    try:
+        pub_date, pk = position.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        if pub_date is None:
+            raise ValueError(position)
+        return direction, pub_date, int(pk)
+    except ValueError:
+        raise InvalidPage('Некорректный курсор')
+
+
+def keyset(queryset, direction, pub_date, pk, pk_field='pk'):
+    """ Окно упорядоченного по (pub_date, pk) queryset после позиции. """
+    if direction == PREVIOUS:
+        queryset = queryset.reverse()
+    if pub_date is None:
+        return queryset
+    lookup = 'lt' if direction == NEXT else 'gt'
+    return queryset.filter(
+        Q(**{f'pub_date__{lookup}': pub_date})
+        | Q(**{'pub_date': pub_date, f'{pk_field}__{lookup}': pk})
+    )
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset-пагинация по (pub_date, id): без COUNT(*) и OFFSET,
+    стоимость страницы не зависит от глубины.
+    """
+    ordering = ('-pub_date', '-pk')
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def fetch(self, direction, pub_date, pk, limit):
+        """ Строки окна: по убыванию для NEXT, по возрастанию для PREVIOUS. """
+        return list(
+            keyset(self.object_list, direction, pub_date, pk)[:limit]
+        )
+
+    def encode(self, direction, row=None):
+        """ Курсор на позицию строки; без строки — на край ленты. """
+        if row is None:
+            return encode_cursor(direction)
+        return encode_cursor(direction, row.pub_date, row.pk)
+
+    def decode(self, cursor):
+        return decode_cursor(cursor)
+
+    def get_page(self, cursor):
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page(None)
+
+    def page(self, cursor):
+        direction, key, pk = (
+            self.decode(cursor) if cursor else (NEXT, None, None)
+        )
+        rows = self.fetch(direction, key, pk, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == NEXT:
+            has_previous = key is not None
+            has_next = has_more
+        else:
+            rows.reverse()
+            has_previous = has_more
+            has_next = key is not None
+        if not rows:
+            has_previous = has_next = False
+        number = 2 if has_previous else 1
+        self._num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = self.encode(NEXT, rows[-1]) if has_next else None
+        page.previous_cursor = (
+            self.encode(PREVIOUS, rows[0]) if has_previous else None
+        )
+        page.last_cursor = self.encode(PREVIOUS) if has_next else None
+        return page
+
+
+def get_page(request, queryset):
+    """ Страница ленты по курсору из ?cursor=. """
+    paginator = CursorPaginator(
+        queryset, settings.PAGINATOR_OBJECTS_PER_PAGE
+    )
+    return paginator.get_page(request.GET.get('cursor'))
@@ -0,0 +1,63 @@
+import re
+
+from django.http import Http404
+from django.template.loader import render_to_string
+
+from core.personal import fragment
+
+from .forms import CommentForm
+from .models import Follow
+
+POST_ID = re.compile(r'[0-9]+')
+USERNAME = re.compile(r'[\w.@+-]+')
+
+
+def _param(params, name, pattern):
+    """
+    Параметр фрагмента для ссылок шаблона. Фрагменты доступны по
+    публичному адресу: с неверным параметром шаблон упал бы на {% url %}.
+    """
+    value = params.get(name, '')
+    if not pattern.fullmatch(value):
+        raise Http404(f'Неверный параметр {name}')
+    return value
+
+
+@fragment('switcher')
+def switcher(request, params):
+    active = params.get('active')
+    return render_to_string(
+        'posts/includes/switcher.html',
+        {'index': active == 'index', 'follow': active == 'follow'},
+        request
+    )
+
+
+@fragment('follow_button')
+def follow_button(request, params):
+    author = _param(params, 'author', USERNAME)
+    user = request.user
+    following = user.is_authenticated and Follow.objects.filter(
+        user=user, author__username=author
+    ).exists()
+    return render_to_string('posts/includes/follow_button.html', {
+        'author': author,
+        'own': user.get_username() == author,
+        'following': following,
+    }, request)
+
+
+@fragment('post_actions')
+def post_actions(request, params):
+    return render_to_string('posts/includes/post_actions.html', {
+        'post_id': _param(params, 'post', POST_ID),
+        'own': str(request.user.pk) == params.get('author'),
+    }, request)
+
+
+@fragment('comment_form')
+def comment_form(request, params):
+    return render_to_string('posts/includes/comment_form.html', {
+        'post_id': _param(params, 'post', POST_ID),
+        'form': CommentForm(),
+    }, request)
@@ -0,0 +1,262 @@
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.core.signals import setting_changed
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .paginator import NEXT, CursorPaginator, pack_cursor, unpack_cursor
+
+WORD = re.compile(r'\w+')
+
+
+def terms(query):
+    """ Слова запроса без операторов и спецсимволов движка. """
+    return WORD.findall(query.lower())
+
+
+class SearchBackend(ABC):
+    """
+    Интерфейс полнотекстового индекса постов.
+    Выдача упорядочена по (rank, post_id): меньший ранг релевантнее.
+    """
+
+    @abstractmethod
+    def index(self, post):
+        """ Добавляет или обновляет пост в индексе. """
+
+    @abstractmethod
+    def remove(self, post_id):
+        """ Убирает пост из индекса. """
+
+    @abstractmethod
+    def rebuild(self):
+        """ Пересобирает индекс по всем постам; возвращает их число. """
+
+    @abstractmethod
+    def search(self, query, direction=NEXT, after=None, limit=10,
+               group_id=None, author_id=None):
+        """
+        Список (rank, post_id) после позиции after = (rank, post_id):
+        по возрастанию для NEXT, по убыванию для PREVIOUS.
+        """
+
+    @abstractmethod
+    def filter(self, queryset, query):
+        """ Queryset постов, подходящих под запрос. """
+
+    def page(self, sql, params, direction, after, limit):
+        """ Окно выборки (score, id) из sql после позиции after. """
+        order = 'ASC' if direction == NEXT else 'DESC'
+        lookup = '>' if direction == NEXT else '<'
+        outer = ''
+        if after is not None:
+            outer = (
+                f'WHERE score {lookup} %s '
+                f'OR (score = %s AND id {lookup} %s)'
+            )
+            params = params + [after[0], after[0], after[1]]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT score, id FROM ({sql}) hits {outer} '
+                f'ORDER BY score {order}, id {order} LIMIT %s',
+                params + [limit]
+            )
+            return cursor.fetchall()
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """ Индекс в виртуальной таблице SQLite FTS5 с ранжированием BM25. """
+    table = 'posts_post_fts'
+
+    def match(self, query):
+        # Каждое слово в кавычках: ввод пользователя не станет
+        # синтаксисом FTS5.
+        return ' '.join(f'"{term}"' for term in terms(query))
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', (post.pk,)
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                (post.pk, post.text)
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', (post_id,)
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+            cursor.execute(
+                f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')"
+            )
+            cursor.execute(f'SELECT count(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+    def search(self, query, direction=NEXT, after=None, limit=10,
+               group_id=None, author_id=None):
+        match = self.match(query)
+        if not match:
+            return []
+        posts = Post._meta.db_table
+        where = [f'{self.table} MATCH %s']
+        params = [match]
+        if group_id is not None:
+            where.append(f'{posts}.group_id = %s')
+            params.append(group_id)
+        if author_id is not None:
+            where.append(f'{posts}.author_id = %s')
+            params.append(author_id)
+        sql = (
+            f'SELECT bm25({self.table}) AS score, {posts}.id '
+            f'FROM {self.table} '
+            f'JOIN {posts} ON {posts}.id = {self.table}.rowid '
+            f'WHERE {" AND ".join(where)}'
+        )
+        return self.page(sql, params, direction, after, limit)
+
+    def filter(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            (match,)
+        ))
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """
+    Полнотекстовый поиск PostgreSQL по GIN-индексу на выражении
+    to_tsvector: индекс обновляется вместе с таблицей постов.
+    """
+    index_name = 'post_text_search_idx'
+    # Без стемминга, как unicode61 в SQLiteFTSBackend.
+    vector = "to_tsvector('simple', text)"
+
+    def query(self, query):
+        return ' '.join(terms(query))
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {self.index_name}')
+        return Post.objects.count()
+
+    def search(self, query, direction=NEXT, after=None, limit=10,
+               group_id=None, author_id=None):
+        text = self.query(query)
+        if not text:
+            return []
+        where = [f"{self.vector} @@ plainto_tsquery('simple', %s)"]
+        params = [text, text]
+        if group_id is not None:
+            where.append('group_id = %s')
+            params.append(group_id)
+        if author_id is not None:
+            where.append('author_id = %s')
+            params.append(author_id)
+        # ts_rank тем больше, чем релевантнее: знак меняется, чтобы
+        # порядок совпадал с BM25 в SQLite. float8 — чтобы ранг из
+        # курсора сравнивался с ним точно.
+        sql = (
+            f'SELECT -ts_rank({self.vector}, '
+            f"plainto_tsquery('simple', %s))::float8 "
+            f'AS score, id FROM {Post._meta.db_table} '
+            f'WHERE {" AND ".join(where)}'
+        )
+        return self.page(sql, params, direction, after, limit)
+
+    def filter(self, queryset, query):
+        text = self.query(query)
+        if not text:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT id FROM {Post._meta.db_table} '
+            f"WHERE {self.vector} @@ plainto_tsquery('simple', %s)",
+            (text,)
+        ))
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    if setting == 'SEARCH_BACKEND':
+        get_backend.cache_clear()
+
+
+class SearchPaginator(CursorPaginator):
+    """ Выдача поиска по релевантности: курсор — (rank, id). """
+
+    def __init__(self, query, per_page, group=None, author=None, **kwargs):
+        super().__init__(
+            Post.objects.select_related('author', 'group'), per_page, **kwargs
+        )
+        self.query = query
+        self.group = group
+        self.author = author
+
+    def encode(self, direction, row=None):
+        if row is None:
+            return pack_cursor(direction)
+        return pack_cursor(direction, f'{row.search_rank!r}|{row.pk}')
+
+    def decode(self, cursor):
+        direction, position = unpack_cursor(cursor)
+        if position is None:
+            return direction, None, None
+        try:
+            rank, pk = position.rsplit('|', 1)
+            return direction, float(rank), int(pk)
+        except ValueError:
+            raise InvalidPage('Некорректный курсор')
+
+    def fetch(self, direction, rank, pk, limit):
+        hits = get_backend().search(
+            self.query,
+            direction=direction,
+            after=None if rank is None else (rank, pk),
+            limit=limit,
+            group_id=self.group and self.group.pk,
+            author_id=self.author and self.author.pk,
+        )
+        posts = self.object_list.in_bulk([post_id for _, post_id in hits])
+        rows = []
+        for rank, post_id in hits:
+            if post_id in posts:
+                posts[post_id].search_rank = rank
+                rows.append(posts[post_id])
+        return rows
+
+
+def get_results(request, query, group=None, author=None):
+    """ Страница выдачи по курсору из ?cursor=. """
+    paginator = SearchPaginator(
+        query, settings.PAGINATOR_OBJECTS_PER_PAGE, group, author
+    )
+    return paginator.get_page(request.GET.get('cursor'))
@@ -0,0 +1,125 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feeds, page_cache, search
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+# Поля пользователя, которые видны на страницах и в карточках.
+DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def post_scopes(post):
+    scopes = ['posts', f'post:{post.pk}', f'author:{post.author.username}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def follow_scopes(follow):
+    return (
+        f'author:{follow.author.username}', f'author:{follow.user.username}'
+    )
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Вход обновляет только last_login: имя не менялось.
+    instance.previous_display = None
+    if instance.pk and not raw and (
+        update_fields is None or set(update_fields) & set(DISPLAY_FIELDS)
+    ):
+        instance.previous_display = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*DISPLAY_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+    previous = getattr(instance, 'previous_display', None)
+    if previous and previous != tuple(
+        getattr(instance, field) for field in DISPLAY_FIELDS
+    ):
+        # Карточки и страницы с именем пользователя зависят от user:<id>.
+        page_cache.bump(
+            f'user:{instance.pk}', f'author:{instance.username}',
+            f'author:{previous[0]}'
+        )
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    instance.previous_group_slug = Group.objects.filter(
+        posts=instance.pk
+    ).values_list('slug', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        feeds.fan_out_post(instance)
+    search.get_backend().index(instance)
+    scopes = post_scopes(instance)
+    previous_group_slug = getattr(instance, 'previous_group_slug', None)
+    if previous_group_slug:
+        scopes.append(f'group:{previous_group_slug}')
+    page_cache.bump(*scopes)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    search.get_backend().remove(instance.pk)
+    page_cache.bump(*post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+    page_cache.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    page_cache.bump(f'post:{instance.post_id}')
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, **kwargs):
+    instance.previous_slug = Group.objects.filter(
+        pk=instance.pk
+    ).values_list('slug', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    # Карточки с названием группы зависят от group-info:<id>.
+    scopes = [
+        'posts', f'group:{instance.slug}', f'group-info:{instance.pk}'
+    ]
+    previous_slug = getattr(instance, 'previous_slug', None)
+    if previous_slug and previous_slug != instance.slug:
+        # Страница по старому адресу должна отвечать 404.
+        scopes.append(f'group:{previous_slug}')
+    page_cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+        counters.bump_user(instance.user_id, 'following_count', 1)
+        feeds.follow_added(instance)
+    page_cache.bump(*follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+    counters.bump_user(instance.user_id, 'following_count', -1)
+    feeds.follow_removed(instance)
+    page_cache.bump(*follow_scopes(instance))
@@ -0,0 +1,12 @@
+from django import template
+
+from posts import fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, template_name, **card_context):
+    return fragments.render_cards(
+        posts, template_name, context.get('request'), **card_context
+    )
@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, User, UserStats
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='Mayakovsky')
+        self.reader = User.objects.create_user(username='Akhmatova')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            {'text': 'Комментарий'}
+        )
+        self.client.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        Comment.objects.all().delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_pages_need_no_aggregate_queries(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        urls = (
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.context['post_count'], 1)
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_drifted_counter_does_not_go_negative(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Текст'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.filter(user=self.author).update(followers_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.filter(user=self.author).update(
+            posts_count=10, followers_count=0
+        )
+        UserStats.objects.filter(user=self.reader).delete()
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('пользователей 2, постов 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
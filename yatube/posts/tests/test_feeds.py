@@ -0,0 +1,68 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import FeedEntry, Follow, Post, PulledAuthor, User
+
+
+class FeedFanOutTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='Tolstoy')
+        self.reader = User.objects.create_user(username='Chekhov')
+        self.other_reader = User.objects.create_user(username='Gogol')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self, client=None):
+        response = (client or self.client).get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_new_post_is_pushed_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.other_reader).exists()
+        )
+        self.assertEqual(self.feed(), [post])
+
+    def test_follow_backfills_and_unfollow_clears(self):
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(3)
+        ]
+        self.client.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        self.assertEqual(self.feed(), posts[::-1])
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    @override_settings(FEED_FANOUT_FOLLOWERS_LIMIT=2)
+    def test_prolific_author_is_pulled_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other_reader, author=self.author)
+        self.assertTrue(
+            PulledAuthor.objects.filter(author=self.author).exists()
+        )
+        post = Post.objects.create(author=self.author, text='Не раздаётся')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed(), [post])
+
+    @override_settings(FEED_FANOUT_FOLLOWERS_LIMIT=2)
+    def test_author_below_limit_is_pushed_again(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other_reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.filter(user=self.other_reader).delete()
+        self.assertFalse(
+            PulledAuthor.objects.filter(author=self.author).exists()
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post])
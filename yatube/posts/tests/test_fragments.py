@@ -0,0 +1,132 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.template.backends.django import Template
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import fragments, page_cache
+from posts.models import Comment, Group, Post, User
+
+CARD = 'posts/includes/post_card.html'
+
+
+class CardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Bunin')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.posts = [
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {i}'
+            )
+            for i in range(10)
+        ]
+
+    def render(self, **context):
+        return fragments.render_cards(
+            Post.objects.select_related('author', 'group'), CARD, **context
+        )
+
+    def test_author_rename_refreshes_cards_and_pages(self):
+        self.render()
+        client = Client()
+        url = reverse('posts:group_posts', args=(self.group.slug,))
+        client.get(url)
+        self.author.first_name = 'Иван'
+        self.author.last_name = 'Бунин'
+        self.author.save()
+        self.assertIn('Иван Бунин', self.render()[0])
+        self.assertContains(client.get(url), 'Иван Бунин')
+
+    def test_renames_are_constant_cache_work(self):
+        client = Client()
+        reader = User.objects.create_user(username='Reader')
+        Comment.objects.create(
+            post=self.posts[0], author=reader, text='Комментарий'
+        )
+        detail_url = reverse('posts:post_detail', args=[self.posts[0].pk])
+        client.get(detail_url)
+        with mock.patch.object(
+            page_cache.cache, 'incr', wraps=page_cache.cache.incr
+        ) as incr:
+            self.group.title = 'Новое название'
+            self.group.save()
+            reader.username = 'Renamed'
+            reader.save()
+        # По три области на переименование, сколько бы ни было постов.
+        self.assertEqual(incr.call_count, 6)
+        response = client.get(detail_url)
+        self.assertContains(response, 'Новое название')
+        self.assertContains(response, 'Renamed')
+
+    def test_cached_page_renders_nothing(self):
+        first = self.render()
+        with mock.patch.object(
+            fragments, 'get_template', wraps=fragments.get_template
+        ) as get_template:
+            second = self.render()
+        get_template.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_cards_fetched_with_one_multi_get(self):
+        self.render()
+        with mock.patch.object(
+            cache, 'get_many', wraps=cache.get_many
+        ) as get_many:
+            self.render()
+        # Версии постов и сами карточки.
+        self.assertEqual(get_many.call_count, 2)
+
+    def test_only_changed_card_is_rendered(self):
+        self.render()
+        post = self.posts[3]
+        post.text = 'Исправленный пост'
+        post.save()
+        Comment.objects.create(
+            post=self.posts[5], author=self.author, text='Комментарий'
+        )
+        with mock.patch.object(
+            Template, 'render', autospec=True, side_effect=Template.render
+        ) as render:
+            cards = self.render()
+        # Карточки отредактированного и прокомментированного постов.
+        self.assertEqual(render.call_count, 2)
+        self.assertIn('Исправленный пост', ''.join(cards))
+
+    def test_group_rename_updates_cards(self):
+        self.render()
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertIn('Новое название', ''.join(self.render()))
+
+    def test_context_is_part_of_key(self):
+        feed = self.render()
+        group_page = self.render(group=self.group)
+        self.assertIn(
+            reverse('posts:group_posts', args=[self.group.slug]), feed[0]
+        )
+        self.assertNotIn(
+            reverse('posts:group_posts', args=[self.group.slug]),
+            group_page[0]
+        )
+
+    def test_feed_pages_use_cards(self):
+        client = Client()
+        client.force_login(self.author)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), 'Пост 9')
+                post = Post.objects.create(
+                    author=self.author, group=self.group, text='Свежий'
+                )
+                self.assertContains(client.get(url), 'Свежий')
+                post.delete()
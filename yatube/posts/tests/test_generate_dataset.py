@@ -0,0 +1,85 @@
+from io import StringIO
+from statistics import median
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.counters import recount_posts, recount_users
+from posts.models import (Comment, FeedEntry, Follow, Group, Post,
+                          PulledAuthor, User)
+from posts.search import get_backend
+
+
+@override_settings(FEED_FANOUT_FOLLOWERS_LIMIT=40)
+class GenerateDatasetTest(TestCase):
+    options = {
+        'users': 200, 'groups': 10, 'posts': 1500, 'comments': 3000,
+        'follows': 15, 'batch_size': 300, 'seed': 7,
+    }
+
+    def generate(self, **options):
+        call_command(
+            'generate_dataset', stdout=StringIO(),
+            **{**self.options, **options}
+        )
+
+    def clear(self):
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+    def snapshot(self):
+        first_user = User.objects.order_by('pk').first().pk
+        first_group = Group.objects.order_by('pk').first().pk
+        return (
+            [
+                (author - first_user, group and group - first_group, text)
+                for author, group, text in Post.objects.order_by('pk')
+                .values_list('author_id', 'group_id', 'text')[:200]
+            ],
+            sorted(
+                (user - first_user, author - first_user)
+                for user, author in Follow.objects.values_list(
+                    'user_id', 'author_id'
+                )
+            ),
+        )
+
+    def test_scale_and_derived_data(self):
+        self.generate()
+        self.assertEqual(User.objects.count(), 200)
+        self.assertEqual(Post.objects.count(), 1500)
+        self.assertGreater(Comment.objects.count(), 1000)
+        self.assertEqual(recount_users(), 0)
+        self.assertEqual(recount_posts(), 0)
+        post = Post.objects.order_by('pk').last()
+        word = post.text.split()[0].strip('.').lower()
+        self.assertTrue(get_backend().search(word))
+
+    def test_follow_graph_is_skewed(self):
+        self.generate()
+        followers = list(
+            User.objects.values_list('stats__followers_count', flat=True)
+        )
+        self.assertGreater(max(followers), 10 * max(median(followers), 1))
+        pulled = set(PulledAuthor.objects.values_list('author_id', flat=True))
+        self.assertTrue(pulled)
+        self.assertFalse(
+            FeedEntry.objects.filter(author_id__in=pulled).exists()
+        )
+        follow = Follow.objects.exclude(author_id__in=pulled).first()
+        self.assertEqual(
+            FeedEntry.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            ).count(),
+            Post.objects.filter(author_id=follow.author_id).count()
+        )
+
+    def test_same_seed_gives_same_data(self):
+        self.generate()
+        first = self.snapshot()
+        self.clear()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+        self.clear()
+        self.generate(seed=8)
+        self.assertNotEqual(self.snapshot(), first)
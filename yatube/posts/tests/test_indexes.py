@@ -0,0 +1,104 @@
+import os
+from unittest import skipUnless
+
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+# Объём ленты для проверки планов; для прогона на большом объёме:
+# EXPLAIN_SEED_POSTS=1000000 python manage.py test posts.tests.test_indexes
+SEED_POSTS: int = int(os.environ.get('EXPLAIN_SEED_POSTS', 2000))
+BATCH_SIZE: int = 10000
+LARGE_TABLES = (
+    'posts_post', 'posts_comment', 'posts_follow', 'posts_feedentry'
+)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN для SQLite')
+class FeedQueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Dostoevsky')
+        cls.reader = User.objects.create_user(username='Turgenev')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        User.objects.bulk_create(
+            User(username=f'reader{i}') for i in range(SEED_POSTS // 10)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=follower, author=author)
+            for follower in User.objects.filter(username__startswith='reader')
+            for author in (cls.author, cls.reader)
+        )
+        for start in range(0, SEED_POSTS, BATCH_SIZE):
+            Post.objects.bulk_create(
+                Post(
+                    author=cls.author,
+                    group=cls.group if i % 2 else None,
+                    text=f'Пост {i}',
+                )
+                for i in range(start, min(start + BATCH_SIZE, SEED_POSTS))
+            )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Последний пост'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def query_plans(self, url):
+        response = self.client.get(url)
+        page_obj = response.context.get('page_obj')
+        params = {}
+        if page_obj is not None and page_obj.next_cursor:
+            params['cursor'] = page_obj.next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                yield query['sql'], [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_views_use_indexes(self):
+        """Ленты читаются по индексу, без полного скана и сортировки."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        for url in urls:
+            for sql, plan in self.query_plans(url):
+                with self.subTest(url=url, sql=sql):
+                    for step in plan:
+                        self.assertNotIn('TEMP B-TREE', step)
+                        if step.split(' ')[:2] in (
+                            ['SCAN', table] for table in LARGE_TABLES
+                        ):
+                            self.assertIn('USING', step, plan)
+
+
+class FollowConstraintTest(TestCase):
+    def test_follow_is_unique(self):
+        user = User.objects.create_user(username='Bunin')
+        author = User.objects.create_user(username='Kuprin')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=user, author=author)
@@ -0,0 +1,269 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import replicas
+from posts import page_cache
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Pasternak')
+        self.reader = User.objects.create_user(username='Tsvetaeva')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Первый пост'
+        )
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+
+    def test_anonymous_hit_does_not_touch_database(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(first.content, second.content)
+
+    def test_authenticated_pages_are_not_shared(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        response = self.author_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, self.author.username)
+
+    def test_new_post_invalidates_feeds(self):
+        for url in self.urls():
+            self.guest_client.get(url)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Свежий пост'
+        )
+        for url in self.urls()[:3]:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Свежий пост')
+
+    def test_group_change_invalidates_both_groups(self):
+        old_url = reverse('posts:group_posts', args=(self.group.slug,))
+        new_url = reverse('posts:group_posts', args=(self.other_group.slug,))
+        self.guest_client.get(old_url)
+        self.guest_client.get(new_url)
+        self.author_client.post(
+            reverse('posts:post_edit', args=(self.post.pk,)),
+            {'text': 'Первый пост', 'group': self.other_group.pk}
+        )
+        self.assertNotContains(self.guest_client.get(old_url), 'Первый пост')
+        self.assertContains(self.guest_client.get(new_url), 'Первый пост')
+
+    def test_slug_change_invalidates_old_group_page(self):
+        old_url = reverse('posts:group_posts', args=(self.group.slug,))
+        self.guest_client.get(old_url)
+        self.group.slug = 'renamed-slug'
+        self.group.save()
+        self.assertEqual(self.guest_client.get(old_url).status_code, 404)
+
+    def test_comment_and_follow_invalidate_pages(self):
+        detail_url = reverse('posts:post_detail', args=(self.post.pk,))
+        profile_url = reverse('posts:profile', args=(self.author.username,))
+        self.guest_client.get(detail_url)
+        self.guest_client.get(profile_url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Новый комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(
+            self.guest_client.get(detail_url), 'Новый комментарий'
+        )
+        self.assertContains(
+            self.guest_client.get(profile_url), 'Подписчиков: 1'
+        )
+
+    def test_unknown_query_parameters_share_page(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(f'{url}?utm=1&x=2')
+        self.assertContains(response, 'Первый пост')
+
+    def test_stale_page_served_while_another_worker_recomputes(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        key = page_cache._page_key('posts:index', page_cache.SHELL, url)
+        # Блокировку пересчёта держит другой воркер.
+        cache.add(f'lock:{key}', 1)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Свежий пост')
+        cache.delete(f'lock:{key}')
+        self.assertContains(self.guest_client.get(url), 'Свежий пост')
+
+    def test_pinned_client_is_not_served_stale_page(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        key = page_cache._page_key('posts:index', page_cache.SHELL, url)
+        cache.add(f'lock:{key}', 1)
+        self.guest_client.cookies[replicas.PIN_COOKIE] = '1'
+        self.assertContains(self.guest_client.get(url), 'Свежий пост')
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Blok')
+        self.reader = User.objects.create_user(username='Bely')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.profile_url = reverse('posts:profile', args=[self.author])
+        self.detail_url = reverse('posts:post_detail', args=[self.post.pk])
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_page_is_not_modified(self):
+        # Вошедшему нужны только сессия и пользователь.
+        for client, queries in ((self.client, 0), (self.reader_client, 2)):
+            first = client.get(self.detail_url)
+            with self.subTest(queries=queries):
+                with self.assertNumQueries(queries):
+                    response = self.revalidate(
+                        client, self.detail_url, first
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_change_in_scope_modifies_page(self):
+        first = self.client.get(self.detail_url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        response = self.revalidate(self.client, self.detail_url, first)
+        self.assertContains(response, 'Комментарий')
+
+    def test_scope_added_by_view_is_tracked(self):
+        # Страница поста показывает счётчики автора: его новый пост
+        # меняет страницу, хотя область author — из самого view.
+        first = self.client.get(self.detail_url)
+        Post.objects.create(author=self.author, text='Другой пост')
+        response = self.revalidate(self.client, self.detail_url, first)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_for_anonymous_only(self):
+        first = self.client.get(self.profile_url)
+        response = self.client.get(
+            self.profile_url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+        authenticated = self.reader_client.get(self.profile_url)
+        self.assertFalse(authenticated.has_header('Last-Modified'))
+        self.assertIn('private', authenticated['Cache-Control'])
+
+    def test_validators_depend_on_user(self):
+        anonymous = self.client.get(self.profile_url)
+        response = self.revalidate(
+            self.reader_client, self.profile_url, anonymous
+        )
+        self.assertContains(response, 'Подписаться')
+        author_client = Client()
+        author_client.force_login(self.author)
+        response = self.revalidate(author_client, self.profile_url, response)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_modifies_profile(self):
+        first = self.reader_client.get(self.profile_url)
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author])
+        )
+        response = self.revalidate(
+            self.reader_client, self.profile_url, first
+        )
+        self.assertContains(response, 'Отписаться')
+
+
+class PageShellTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Akhmatova')
+        self.reader = User.objects.create_user(username='Gumilev')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.profile_url = reverse('posts:profile', args=[self.author])
+        self.detail_url = reverse('posts:post_detail', args=[self.post.pk])
+
+    def test_shell_is_shared_between_users(self):
+        self.author_client.get(self.detail_url)
+        # Оболочку нарисовал автор: читателю остаются сессия,
+        # пользователь и его собственные фрагменты.
+        with self.assertNumQueries(2):
+            response = self.reader_client.get(self.detail_url)
+        self.assertContains(response, 'Пользователь: Gumilev')
+        self.assertNotContains(response, 'Пользователь: Akhmatova')
+        self.assertNotContains(
+            response, reverse('posts:post_edit', args=[self.post.pk])
+        )
+        self.assertContains(
+            response, reverse('posts:add_comment', args=[self.post.pk])
+        )
+        self.assertNotContains(response, '<esi:include')
+
+    def test_follow_button_is_personal(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(self.profile_url)
+        self.assertContains(
+            self.reader_client.get(self.profile_url), 'Отписаться'
+        )
+        response = self.author_client.get(self.profile_url)
+        self.assertNotContains(response, 'Отписаться')
+        self.assertNotContains(response, 'Подписаться')
+
+    def test_fragment_view_is_private(self):
+        response = self.reader_client.get(
+            reverse('fragment', args=['header'])
+        )
+        self.assertContains(response, 'Gumilev')
+        self.assertIn('private', response['Cache-Control'])
+        missing = self.reader_client.get(reverse('fragment', args=['nope']))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_fragment_with_bad_params_is_not_found(self):
+        for name, query in (
+            ('comment_form', ''), ('comment_form', '?post=abc'),
+            ('post_actions', '?post=-1'), ('follow_button', ''),
+            ('follow_button', '?author=a/b'),
+        ):
+            with self.subTest(name=name, query=query):
+                response = self.reader_client.get(
+                    reverse('fragment', args=[name]) + query
+                )
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(PAGE_CACHE_SHELL='esi')
+    def test_esi_mode_leaves_markers_to_proxy(self):
+        response = self.reader_client.get(self.detail_url)
+        self.assertContains(response, '<esi:include')
+        self.assertNotContains(response, 'Пользователь: Gumilev')
+        self.assertTrue(response.has_header('Surrogate-Control'))
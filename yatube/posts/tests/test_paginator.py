@@ -0,0 +1,66 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.paginator import CursorPaginator
+
+POSTS_COUNT: int = 25
+PER_PAGE: int = 10
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pushkin')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {i}')
+            for i in range(POSTS_COUNT)
+        ]
+
+    def setUp(self):
+        self.paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+
+    def test_pages_walk_forward_and_back(self):
+        """Курсоры ведут по ленте без пропусков и повторов."""
+        expected = sorted(
+            self.posts, key=lambda post: (post.pub_date, post.pk),
+            reverse=True
+        )
+        first = self.paginator.get_page(None)
+        second = self.paginator.get_page(first.next_cursor)
+        third = self.paginator.get_page(second.next_cursor)
+        self.assertEqual(
+            list(first) + list(second) + list(third), expected
+        )
+        self.assertFalse(first.has_previous())
+        self.assertTrue(second.has_previous())
+        self.assertFalse(third.has_next())
+        back = self.paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_last_page(self):
+        first = self.paginator.get_page(None)
+        last = self.paginator.get_page(first.last_cursor)
+        self.assertEqual(len(last), PER_PAGE)
+        self.assertFalse(last.has_next())
+        self.assertTrue(last.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        page = self.paginator.get_page('не-курсор')
+        self.assertEqual(list(page), list(self.paginator.get_page(None)))
+
+    def test_page_does_not_count(self):
+        """Страница ленты не выполняет COUNT и OFFSET."""
+        client = Client()
+        first = client.get(reverse('posts:index'))
+        cursor = first.context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            client.get(reverse('posts:index'), {'cursor': cursor})
+        for query in queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('COUNT(', query['sql'].upper())
+                self.assertNotIn('OFFSET', query['sql'].upper())
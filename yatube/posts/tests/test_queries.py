@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+PAGE_SIZE: int = 10
+
+
+class QueryCountTest(TestCase):
+    """Число запросов каждой страницы не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Blok')
+        cls.reader = User.objects.create_user(username='Esenin')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = cls.create_posts(1)[0]
+
+    @classmethod
+    def create_posts(cls, count):
+        posts = []
+        for i in range(count):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Комментарий {i}'
+            )
+            posts.append(post)
+        return posts
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def count_queries(self, client, method, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            getattr(client, method)(url)
+        return len(queries)
+
+    def requests(self):
+        post_id = self.post.pk
+        username = self.author.username
+        return (
+            (self.client, 'get', reverse('posts:index')),
+            (self.client, 'get', reverse(
+                'posts:group_posts', args=(self.group.slug,)
+            )),
+            (self.client, 'get', reverse('posts:profile', args=(username,))),
+            (self.client, 'get', reverse(
+                'posts:post_detail', args=(post_id,)
+            )),
+            (self.client, 'get', reverse('posts:post_create')),
+            (self.author_client, 'get', reverse(
+                'posts:post_edit', args=(post_id,)
+            )),
+            (self.client, 'post', reverse(
+                'posts:add_comment', args=(post_id,)
+            )),
+            (self.client, 'get', reverse('posts:follow_index')),
+            (self.client, 'get', reverse(
+                'posts:profile_unfollow', args=(username,)
+            )),
+            (self.client, 'get', reverse(
+                'posts:profile_follow', args=(username,)
+            )),
+        )
+
+    def test_query_count_is_bounded(self):
+        single = [
+            self.count_queries(*request) for request in self.requests()
+        ]
+        self.create_posts(PAGE_SIZE * 2)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.reader, text='Ещё один')
+            for _ in range(PAGE_SIZE)
+        )
+        for request, expected in zip(self.requests(), single):
+            with self.subTest(url=request[2]):
+                self.assertEqual(self.count_queries(*request), expected)
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(name):
+    content = BytesIO()
+    Image.new('RGB', (100, 50), color=(255, 0, 0)).save(content, 'JPEG')
+    return SimpleUploadedFile(
+        name, content.getvalue(), content_type='image/jpeg'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ImageVariantsTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        thumbnails.wait()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Lermontov')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, name):
+        post = Post.objects.create(
+            author=self.user, text='Пост с картинкой', image=image_file(name)
+        )
+        thumbnails.enqueue(post)
+        thumbnails.wait()
+        post.refresh_from_db()
+        return post
+
+    def test_request_never_decodes_image(self):
+        """Запрос отдаёт заглушку, варианты нарезает рабочий процесс."""
+        post = Post.objects.create(
+            author=self.user, text='Пост с картинкой',
+            image=image_file('red.jpg')
+        )
+        url = reverse('posts:post_detail', args=(post.pk,))
+        with mock.patch.object(
+            Image, 'open', side_effect=Image.open
+        ) as image_open, mock.patch.object(
+            default.kvstore, 'get', side_effect=default.kvstore.get
+        ) as kvstore_get:
+            response = self.client.get(url)
+            self.assertContains(response, 'aspect-ratio')
+            self.assertNotContains(response, 'srcset')
+            thumbnails.wait()
+            response = self.client.get(url)
+        image_open.assert_not_called()
+        kvstore_get.assert_not_called()
+        self.assertContains(response, '/media/variants/posts/red/320.jpg 320w')
+        self.assertNotContains(response, 'aspect-ratio')
+
+    def test_manifest_lists_every_width_and_format(self):
+        post = self.create_post('blue.jpg')
+        manifest = json.loads(post.image_variants)
+        options = settings.POST_IMAGE_VARIANTS
+        self.assertEqual(manifest['source'], post.image.name)
+        self.assertEqual(
+            list(manifest['variants']),
+            [
+                thumbnails.FORMATS[name][1]
+                for name in thumbnails.available_formats()
+            ]
+        )
+        width, height = options['ratio']
+        for content_type, variants in manifest['variants'].items():
+            for size, path in variants:
+                with self.subTest(content_type=content_type, size=size):
+                    with Image.open(f'{TEMP_MEDIA_ROOT}/{path}') as image:
+                        self.assertEqual(
+                            image.size, (size, round(size * height / width))
+                        )
+            self.assertEqual(
+                [size for size, _ in variants], list(options['widths'])
+            )
+
+    @override_settings(POST_IMAGE_VARIANTS={
+        **settings.POST_IMAGE_VARIANTS, 'formats': ('avif', 'webp', 'jpeg')
+    })
+    def test_unsupported_formats_are_skipped(self):
+        with mock.patch.object(Image, 'SAVE', {'JPEG': None, 'WEBP': None}):
+            self.assertEqual(thumbnails.available_formats(), ['webp', 'jpeg'])
+
+    def test_create_enqueues_image(self):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Новый пост', 'image': image_file('green.jpg')}
+        )
+        thumbnails.wait()
+        post = Post.objects.get(text='Новый пост')
+        self.assertIsNotNone(thumbnails.get_manifest(post))
+
+    def test_edit_replaces_stale_manifest(self):
+        post = self.create_post('old.jpg')
+        self.client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            {'text': 'Пост', 'image': image_file('new.jpg')}
+        )
+        thumbnails.wait()
+        post.refresh_from_db()
+        self.assertEqual(
+            thumbnails.get_manifest(post)['source'], 'posts/new.jpg'
+        )
+        old_variant = f'{TEMP_MEDIA_ROOT}/variants/posts/old/320.jpg'
+        self.assertFalse(os.path.exists(old_variant))
+
+    def test_failed_image_is_not_retried(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост',
+            image=SimpleUploadedFile('broken.jpg', b'not an image')
+        )
+        thumbnails.enqueue(post)
+        thumbnails.wait()
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(post.pk,))
+            )
+        enqueue.assert_not_called()
+        self.assertContains(response, f'src="{post.image.url}"')
+
+    def test_command_fills_missing_manifests(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=image_file('cmd.jpg')
+        )
+        call_command('generate_image_variants', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertIsNotNone(thumbnails.get_manifest(post))
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase, Client
 from http import HTTPStatus
 from posts.models import Group, Post, User
@@ -22,6 +23,7 @@ class StaticURLTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client_author = Client()
         self.authorized_client_author.force_login(StaticURLTests.user_author)
@@ -1,8 +1,10 @@
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django import forms
 from django.conf import settings
+from posts import thumbnails
 from posts.models import Group, Post, User, Comment, Follow
 import tempfile
 import shutil
@@ -54,10 +56,12 @@ class TestsPostPages(TestCase):
 
     @classmethod
     def tearDownClass(cls):
+        thumbnails.wait()
         shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
         super().tearDownClass()
 
     def setUp(self) -> None:
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client_author = Client()
         self.authorized_client_author.force_login(TestsPostPages.user_author)
@@ -153,22 +157,21 @@ class TestsPostPages(TestCase):
         self.assertEqual(len(response.context['page_obj']), 10)
 
     def test_second_page_contains_seven_records(self):
-        response = self.guest_client.get(reverse('posts:index') + '?page=2')
-        self.assertEqual(len(response.context['page_obj']), 7)
-
-        response = self.guest_client.get(
+        urls_records = {
+            reverse('posts:index'): 7,
             reverse(
                 'posts:group_posts', kwargs={'slug': self.group.slug}
-            ) + '?page=2'
-        )
-        self.assertEqual(len(response.context['page_obj']), 6)
-
-        response = self.guest_client.get(
+            ): 6,
             reverse(
                 'posts:profile', kwargs={'username': self.user_author}
-            ) + '?page=2'
-        )
-        self.assertEqual(len(response.context['page_obj']), 6)
+            ): 6,
+        }
+        for url, records in urls_records.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                cursor = response.context['page_obj'].next_cursor
+                response = self.guest_client.get(url, {'cursor': cursor})
+                self.assertEqual(len(response.context['page_obj']), records)
 
     def test_page_edit_form_show_correct_context(self):
         response = self.authorized_client_author.get(
@@ -266,6 +269,7 @@ class CommentViewsTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.author)
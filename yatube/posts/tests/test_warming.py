@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts import warming
+from posts.models import Follow, Group, Post, User
+
+
+class WarmingMixin:
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = override_settings(PAGE_STATS_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.author = User.objects.create_user(username='Gorky')
+        self.reader = User.objects.create_user(username='Chekhov')
+        self.small = Group.objects.create(
+            title='Маленькая', slug='small', description='Описание'
+        )
+        self.large = Group.objects.create(
+            title='Большая', slug='large', description='Описание'
+        )
+        Post.objects.create(author=self.reader, group=self.small, text='1')
+        Post.objects.bulk_create(
+            Post(author=self.author, group=self.large, text=f'Пост {i}')
+            for i in range(25)
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def warm(self, *args):
+        out = StringIO()
+        call_command('warm_cache', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+
+@override_settings(CACHE_WARMING=dict(
+    settings.CACHE_WARMING, index_pages=2, groups=1, authors=1
+))
+class WarmCacheTest(WarmingMixin, TestCase):
+    def test_heuristic_picks_hot_pages(self):
+        paths = warming.heuristic()
+        self.assertEqual(len(paths), 4)
+        self.assertEqual(paths[0], reverse('posts:index'))
+        self.assertTrue(paths[1].startswith('/?cursor='))
+        self.assertEqual(paths[2:], [
+            reverse('posts:group_posts', args=[self.large.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+        ])
+
+    def test_warmed_pages_are_cache_hits(self):
+        output = self.warm('--workers', '1')
+        self.assertIn('отрисовано 4', output)
+        for path in warming.heuristic():
+            with self.subTest(path=path), self.assertNumQueries(0):
+                self.client.get(path)
+        self.assertIn('уже в кэше 4', self.warm('--workers', '1'))
+
+    def test_recorded_accesses_are_warmed(self):
+        url = reverse('posts:group_posts', args=[self.small.slug])
+        for _ in range(3):
+            self.client.get(url)
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(warming.collect()[url], 3)
+        cache.clear()
+        output = self.warm('--source', 'stats', '--workers', '1')
+        self.assertIn('отрисовано 2', output)
+        self.assertIn('Покрыто 100% записанных обращений (4 из 4)', output)
+
+    def test_failed_page_is_reported(self):
+        self.client.get('/group/missing/')
+        output = self.warm('--source', 'stats', '--workers', '1')
+        self.assertIn('ошибок 1', output)
+        self.assertIn('Покрыто 0%', output)
+
+
+@override_settings(CACHE_WARMING=dict(
+    settings.CACHE_WARMING, index_pages=2, groups=2, authors=2
+))
+class WarmCachePoolTest(WarmingMixin, TransactionTestCase):
+    def test_pool_warms_pages(self):
+        output = self.warm('--workers', '3')
+        self.assertIn('отрисовано 6', output)
+        self.assertIn('ошибок 0', output)
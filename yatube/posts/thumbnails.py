@@ -0,0 +1,274 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from core import metrics, workers
+
+from . import page_cache
+from .models import Post
+from .signals import post_scopes
+
+logger = logging.getLogger(__name__)
+
+# Формат из настроек -> (кодек Pillow, MIME-тип, расширение файла).
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', 'avif'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+}
+FALLBACK = 'jpeg'
+# Настройки, которые рабочие процессы берут у родителя, а не из модуля.
+WORKER_SETTINGS = ('MEDIA_ROOT', 'MEDIA_URL', 'DEFAULT_FILE_STORAGE')
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+_done = threading.Condition(_lock)
+
+
+def available_formats():
+    """ Форматы из настроек, доступные в Pillow; JPEG всегда последний. """
+    Image.init()
+    formats = [
+        name for name in settings.POST_IMAGE_VARIANTS['formats']
+        if name != FALLBACK and FORMATS[name][0] in Image.SAVE
+    ]
+    return formats + [FALLBACK]
+
+
+def variant_name(name, width, extension):
+    stem, _ = os.path.splitext(name)
+    return f'variants/{stem}/{width}.{extension}'
+
+
+def render(name, formats, options):
+    """
+    Нарезает исходник на ширины из настроек во всех форматах.
+    Выполняется в рабочем процессе: только файлы и Pillow, без БД.
+    """
+    ratio_width, ratio_height = options['ratio']
+    with default_storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source)).convert('RGB')
+    variants = {}
+    for width in options['widths']:
+        size = (width, round(width * ratio_height / ratio_width))
+        resized = ImageOps.fit(image, size, Image.LANCZOS, centering=(0, .5))
+        for format_name in formats:
+            codec, content_type, extension = FORMATS[format_name]
+            content = BytesIO()
+            resized.save(content, codec, quality=options['quality'])
+            path = variant_name(name, width, extension)
+            default_storage.delete(path)
+            path = default_storage.save(path, ContentFile(content.getvalue()))
+            variants.setdefault(content_type, []).append((width, path))
+    return {
+        'source': name,
+        'ratio': [ratio_width, ratio_height],
+        'variants': variants,
+    }
+
+
+def _failed_key(name):
+    return f'thumbnail-failed:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def _paths(raw):
+    """ Файлы вариантов из манифеста в JSON. """
+    try:
+        manifest = json.loads(raw or '{}')
+    except ValueError:
+        return set()
+    return {
+        path
+        for variants in manifest.get('variants', {}).values()
+        for _, path in variants
+    }
+
+
+def _delete(paths):
+    for path in paths:
+        default_storage.delete(path)
+
+
+def _refresh(post_id):
+    """ Страницы с постом перерисуются с новой картинкой. """
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is not None:
+        page_cache.bump(*post_scopes(post))
+
+
+def _store(name, post_id, caller, future):
+    try:
+        try:
+            manifest = json.dumps(future.result())
+        except Exception:
+            # Битый файл не нарезается заново при каждой отрисовке:
+            # до THUMBNAIL_RETRY_TIMEOUT страницы показывают исходник.
+            cache.set(
+                _failed_key(name), True, settings.THUMBNAIL_RETRY_TIMEOUT
+            )
+            _refresh(post_id)
+            raise
+        previous = Post.objects.filter(pk=post_id).values_list(
+            'image_variants', flat=True
+        ).first()
+        # Картинку могли заменить, пока шла нарезка: манифест старого
+        # файла не записывается, а его варианты не нужны.
+        updated = Post.objects.filter(pk=post_id, image=name).update(
+            image_variants=manifest
+        )
+        if updated:
+            _delete(_paths(previous) - _paths(manifest))
+            _refresh(post_id)
+        else:
+            _delete(_paths(manifest))
+        metrics.THUMBNAILS.inc('ok')
+    except Exception:
+        metrics.THUMBNAILS.inc('error')
+        logger.exception('Не удалось нарезать картинку %s', name)
+    finally:
+        # Колбэк идёт в служебном потоке пула: его соединение само не
+        # закроется и держало бы место в пуле соединений.
+        if threading.get_ident() != caller:
+            connection.close()
+        with _done:
+            _pending.pop(name, None)
+            _done.notify_all()
+
+
+class InlineExecutor(Executor):
+    """ Нарезка в вызывающем потоке: THUMBNAIL_WORKERS = 0, для тестов. """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None and not settings.THUMBNAIL_WORKERS:
+            _executor = InlineExecutor()
+        elif _executor is None:
+            # Не fork: у веб-процесса уже есть потоки, и ребёнок мог бы
+            # унаследовать их блокировки захваченными.
+            _executor = ProcessPoolExecutor(
+                settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=workers.setup,
+                initargs=({
+                    name: getattr(settings, name) for name in WORKER_SETTINGS
+                },),
+            )
+        return _executor
+
+
+def enqueue(post):
+    """ Ставит нарезку картинки поста в очередь пула процессов. """
+    if not post.image:
+        return
+    name = post.image.name
+    executor = get_executor()
+    with _lock:
+        if name in _pending:
+            return _pending[name]
+        future = _pending[name] = executor.submit(
+            render, name, available_formats(), settings.POST_IMAGE_VARIANTS
+        )
+    future.add_done_callback(
+        partial(_store, name, post.pk, threading.get_ident())
+    )
+    return future
+
+
+def wait(timeout=None):
+    """ Дожидается картинок в очереди: для тестов и остановки. """
+    with _done:
+        return _done.wait_for(lambda: not _pending, timeout)
+
+
+@receiver(setting_changed)
+def reset_executor(setting, **kwargs):
+    # Рабочие процессы получают настройки при запуске.
+    global _executor
+    if setting not in ('MEDIA_ROOT', 'THUMBNAIL_WORKERS'):
+        return
+    wait()
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def get_manifest(post):
+    """ Манифест вариантов текущей картинки поста или None. """
+    if not post.image or not post.image_variants:
+        return None
+    try:
+        manifest = json.loads(post.image_variants)
+    except ValueError:
+        return None
+    if manifest.get('source') != post.image.name:
+        return None
+    return manifest
+
+
+def get_picture(post):
+    """
+    Данные для <picture> из манифеста на строке поста.
+    Пока вариантов нет, ставит картинку в очередь и возвращает
+    только пропорции для заглушки; если нарезка не удалась —
+    исходный файл.
+    """
+    if not post.image:
+        return None
+    manifest = get_manifest(post)
+    if manifest is None and cache.get(_failed_key(post.image.name)):
+        return {'ready': True, 'sources': [], 'src': post.image.url}
+    if manifest is None:
+        enqueue(post)
+        width, height = settings.POST_IMAGE_VARIANTS['ratio']
+        return {'ready': False, 'width': width, 'height': height}
+    width, height = manifest['ratio']
+    sources = [
+        {
+            'type': content_type,
+            'srcset': ', '.join(
+                f'{default_storage.url(path)} {size}w'
+                for size, path in variants
+            ),
+        }
+        for content_type, variants in manifest['variants'].items()
+    ]
+    fallback = sources.pop()
+    _, largest = manifest['variants'][fallback['type']][-1]
+    return {
+        'ready': True,
+        'width': width,
+        'height': height,
+        'sources': sources,
+        'src': default_storage.url(largest),
+        'srcset': fallback['srcset'],
+        'sizes': settings.POST_IMAGE_VARIANTS['sizes'],
+    }
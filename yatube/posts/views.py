@@ -1,30 +1,38 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.replicas import replica_reads
 
+from . import thumbnails
+from .counters import get_stats
+from .feeds import TimelinePaginator
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Comment, Follow
+from .models import Group, Post, User, Follow
+from .page_cache import cache_page_by_scopes, depends_on
+from .paginator import get_page
+from .search import get_results
 
 
+@replica_reads
+@cache_page_by_scopes('posts:index', lambda: ('posts',))
 def index(request):
-    posts = Post.objects.order_by('-pub_date')
-    paginator = Paginator(posts, settings.PAGINATOR_OBJECTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.select_related('author', 'group')
+    page_obj = get_page(request, posts)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@cache_page_by_scopes(
+    'posts:group_posts', lambda slug: (f'group:{slug}',)
+)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.order_by('-pub_date')
-    paginator = Paginator(posts, settings.PAGINATOR_OBJECTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.select_related('author')
+    page_obj = get_page(request, posts)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -32,50 +40,85 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_reads
+@cache_page_by_scopes(
+    'posts:profile', lambda username: (f'author:{username}',)
+)
 def profile(request, username):
-    user = request.user
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.order_by('-pub_date')
-    post_count = post_list.count
-    paginator = Paginator(post_list, settings.PAGINATOR_OBJECTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = user.is_authenticated and Follow.objects.filter(
-        user=request.user,
-        author=author).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = get_stats(author)
+    post_list = author.posts.select_related('author', 'group')
+    page_obj = get_page(request, post_list)
     context = {
         'page_obj': page_obj,
         'username': author,
-        'paginator': paginator,
-        'post_count': post_count,
-        'following': following
+        'paginator': page_obj.paginator,
+        'post_count': stats.posts_count,
+        'stats': stats,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@replica_reads
+@cache_page_by_scopes(
+    'posts:post_detail', lambda post_id: (f'post:{post_id}',), params=()
+)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comment = Comment.objects.select_related("post").filter(post=post)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    comment = post.comments.select_related('author')
+    # Имена автора, комментаторов и название группы — на странице.
+    depends_on(request, f'author:{post.author.username}', *{
+        f'user:{item.author_id}' for item in comment
+    })
+    if post.group_id:
+        depends_on(request, f'group-info:{post.group_id}')
     form = CommentForm(request.POST or None)
     author_name = post.author
     context = {
         'form': form,
         'post': post,
         'author_name': author_name,
-        'comment': comment
+        'comment': comment,
+        'post_count': get_stats(author_name).posts_count,
 
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    group = author = None
+    if request.GET.get('group'):
+        group = get_object_or_404(Group, slug=request.GET['group'])
+    if request.GET.get('author'):
+        author = get_object_or_404(User, username=request.GET['author'])
+    page_obj = get_results(request, query, group, author)
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.all(),
+        'page_obj': page_obj,
+        'page_query': params.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    thumbnails.enqueue(post)
     return redirect('posts:profile', request.user)
 
 
@@ -90,7 +133,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect('posts:post_detail', post_id=post_id)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -109,12 +154,12 @@ def add_comment(request, post_id):
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    posts = Post.objects.select_related('author', 'group').filter(
-        author__following__user=request.user)
-    paginator = Paginator(posts, settings.PAGINATOR_OBJECTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = TimelinePaginator(
+        request.user, settings.PAGINATOR_OBJECTS_PER_PAGE
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     context = {
         'page_obj': page_obj,
     }
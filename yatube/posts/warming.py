@@ -0,0 +1,148 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.signals import setting_changed
+from django.db.models import Count
+from django.dispatch import receiver
+from django.http import HttpRequest, QueryDict
+from django.urls import resolve, reverse
+
+from .models import Group, Post, User
+from .paginator import CursorPaginator
+
+_lock = threading.Lock()
+_hits = Counter()
+_flushed = time.monotonic()
+
+
+def record(path):
+    """ Обращение анонима к кэшируемой странице: для прогрева. """
+    global _flushed
+    with _lock:
+        if path in _hits or len(_hits) < settings.PAGE_STATS_MAX_PATHS:
+            _hits[path] += 1
+        if time.monotonic() - _flushed >= settings.PAGE_STATS_INTERVAL:
+            _flushed = time.monotonic()
+            _write()
+
+
+def _write():
+    os.makedirs(settings.PAGE_STATS_DIR, exist_ok=True)
+    path = os.path.join(settings.PAGE_STATS_DIR, f'{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+        json.dump(_hits, file, ensure_ascii=False)
+    os.replace(f'{path}.tmp', path)
+
+
+@atexit.register
+def flush():
+    """ Сбрасывает обращения процесса в его файл. """
+    with _lock:
+        if _hits:
+            _write()
+
+
+def collect():
+    """ Обращения к страницам по всем процессам. """
+    flush()
+    merged = Counter()
+    for path in glob.glob(os.path.join(settings.PAGE_STATS_DIR, '*.json')):
+        try:
+            with open(path, encoding='utf-8') as file:
+                merged.update(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return merged
+
+
+def reset():
+    with _lock:
+        _hits.clear()
+        for path in glob.glob(
+            os.path.join(settings.PAGE_STATS_DIR, '*.json')
+        ):
+            os.remove(path)
+
+
+@receiver(setting_changed)
+def reset_stats(setting, **kwargs):
+    if setting == 'PAGE_STATS_DIR':
+        with _lock:
+            _hits.clear()
+
+
+def _pages(path, queryset, count):
+    """ Первые count страниц ленты: курсоры считаются без отрисовки. """
+    paginator = CursorPaginator(
+        queryset.only('pk', 'pub_date'), settings.PAGINATOR_OBJECTS_PER_PAGE
+    )
+    cursor = None
+    for number in range(count):
+        if number:
+            cursor = paginator.page(cursor).next_cursor
+            if cursor is None:
+                return
+        yield f'{path}?cursor={cursor}' if cursor else path
+
+
+def heuristic(options=None):
+    """
+    Страницы, горячие без всякой статистики: начало главной,
+    крупнейшие группы по числу постов и авторы с наибольшим числом
+    подписчиков. Объёмы — из settings.CACHE_WARMING.
+    """
+    options = dict(settings.CACHE_WARMING, **(options or {}))
+    paths = list(_pages(
+        reverse('posts:index'), Post.objects.all(), options['index_pages']
+    ))
+    groups = Group.objects.annotate(
+        posts_count=Count('posts')
+    ).order_by('-posts_count', 'pk')[:options['groups']]
+    for group in groups:
+        paths += _pages(
+            reverse('posts:group_posts', args=[group.slug]),
+            group.posts.all(), options['group_pages']
+        )
+    authors = User.objects.filter(stats__isnull=False).order_by(
+        '-stats__followers_count', 'pk'
+    )[:options['authors']]
+    for author in authors:
+        paths += _pages(
+            reverse('posts:profile', args=[author.username]),
+            author.posts.all(), options['author_pages']
+        )
+    return paths
+
+
+def warm(path):
+    """
+    Отрисовывает страницу, как для анонима, через страничный кэш.
+    Возвращает True, если страница отрисована, False — если уже
+    была в кэше; бросает исключение, если не кэшируется.
+    """
+    url = urlsplit(path)
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = url.path
+    request.GET = QueryDict(url.query)
+    request.META.update({
+        'REQUEST_METHOD': 'GET', 'QUERY_STRING': url.query,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+    })
+    request.user = AnonymousUser()
+    # Сам прогрев в статистику обращений не попадает.
+    request.cache_warming = True
+    request.resolver_match = match = resolve(request.path_info)
+    response = match.func(request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        raise ValueError(f'статус {response.status_code}')
+    # Области страница получает, только когда её действительно рисуют.
+    return hasattr(request, 'page_cache_scopes')
@@ -0,0 +1,27 @@
+"""
+Настройки по профилям: DJANGO_ENV = dev, test или prod.
+Без переменной manage.py test и pytest берут test, WSGI-сервер — prod,
+остальное — dev.
+"""
+import os
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+def _default_env():
+    if sys.argv[1:2] == ['test'] or 'pytest' in sys.modules:
+        return 'test'
+    return 'dev'
+
+
+ENV = os.environ.get('DJANGO_ENV') or _default_env()
+
+if ENV == 'dev':
+    from .dev import *  # noqa: F401,F403
+elif ENV == 'test':
+    from .test import *  # noqa: F401,F403
+elif ENV == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f'Неизвестный профиль DJANGO_ENV={ENV}')
@@ -0,0 +1,18 @@
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, LOGGING, MIDDLEWARE, os
+
+DEBUG = True
+
+INSTALLED_APPS = INSTALLED_APPS + ['debug_toolbar']
+MIDDLEWARE = MIDDLEWARE + ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
+
+SERVER_TIMING = True
+
+# В разработке запросы и так видны в runserver.
+LOGGING['loggers']['core.timing']['level'] = os.environ.get(
+    'REQUEST_LOG_LEVEL', 'WARNING'
+)
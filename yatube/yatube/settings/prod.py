@@ -0,0 +1,27 @@
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, TEMPLATES, os
+
+if 'SECRET_KEY' not in os.environ:
+    raise ImproperlyConfigured('В профиле prod нужен SECRET_KEY.')
+SECRET_KEY = os.environ['SECRET_KEY']
+
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost').split(',')
+
+# Шаблоны компилируются один раз на процесс.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Соединение с БД живёт между запросами и проверяется перед ними;
+# с пулом оно и так переживает запрос — в пуле.
+if 'pool' not in DATABASES['default']['OPTIONS']:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.environ.get('CONN_MAX_AGE', 60)
+    )
+CONN_HEALTH_CHECKS = True
@@ -0,0 +1,25 @@
+import tempfile
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, LOGGING, os
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Картинки нарезаются сразу: фоновый поток не пишет в тестовую БД
+# посреди следующего теста.
+THUMBNAIL_WORKERS = 0
+
+TEST_FILES_DIR = os.path.join(tempfile.gettempdir(), 'yatube-test')
+METRICS_DIR = os.path.join(TEST_FILES_DIR, 'metrics')
+QUERY_STATS_DIR = os.path.join(TEST_FILES_DIR, 'queries')
+PROFILE_DIR = os.path.join(TEST_FILES_DIR, 'profiles')
+PAGE_STATS_DIR = os.path.join(TEST_FILES_DIR, 'pages')
+
+LOGGING['loggers']['core.timing']['level'] = 'WARNING'
+
+# Вторая база SQLite для проверки реплик. Маршрутизация на неё
+# включается только в тестах реплик через DATABASE_REPLICAS.
+if DATABASES['default']['ENGINE'] == 'core.backends.sqlite3':
+    DATABASES['replica'] = dict(
+        DATABASES['default'], NAME=os.path.join(TEST_FILES_DIR, 'replica')
+    )
@@ -3,5 +3,8 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+# Любой WSGI-сервер, не только gunicorn, — боевой запуск; runserver
+# к этому модулю приходит с уже загруженными настройками.
+os.environ.setdefault('DJANGO_ENV', 'prod')
 
 application = get_wsgi_application()